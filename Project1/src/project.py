@@ -1,125 +1,628 @@
 import sys
 import math
-from pysat.solvers import Glucose4, Glucose3
+import json
+import random
+import argparse
+import threading
+import os
+import time
+import hashlib
+import itertools
+import functools
+import collections
+import tempfile
+import shutil
+import multiprocessing
+from multiprocessing.connection import wait
+import numpy as np
+from pysat.solvers import Glucose4, Glucose3, Solver
 from pysat.examples.rc2 import RC2
 from pysat.formula import WCNF
 from pysat.card import CardEnc, EncType
 from pysat.formula import IDPool
 
-class Product:
-    def __init__(self, id, beltTime):
-        self.id = id
-        self.beltTime = beltTime
-
-class Order:
-    def __init__(self, id, numProds, prods):
-        self.id = id
-        self.numProds = numProds
-        self.prods = prods
-
-class Runner:
-    def __init__(self, id, initialPos):
-        self.id = id
-        self.initialPos = initialPos
-
-class Problem:
-    def __init__(self, lines):
-        parseCounter = 0
-        # Line 1 - Number of Runners
-        self.numRunners = int(lines[parseCounter].rstrip())
-        parseCounter += 1
-
-        # Line 2 - Number of Products
-        self.numProds = int(lines[parseCounter].rstrip())
-        parseCounter += 1
-
-        # Line 3 - Runners Initial Positions
-        rPos = lines[parseCounter].rstrip().split()
-        self.runners = [Runner(i+1, int(rPos[i])) for i in range(self.numRunners)]
-        
-        parseCounter += 1
-
-        # Line 4 - __ Time between Products Shelves
-        self.shelvesTimes = []
-        l = parseCounter
-        for i in range(l, l + self.numProds):
-            line = [int(j) for j in lines[i].rstrip().split()]
-            self.shelvesTimes.append(line)
-            parseCounter += 1
-            
-        # Time in Conveyer Belt for Each Product
-        self.products = []
-        line = lines[parseCounter].rstrip().split()
-        parseCounter += 1
-        for i in range(self.numProds):
-            self.products.append(Product(i+1, int(line[i])))
-        
-        # Number of Orders
-        self.numOrders = int(lines[parseCounter].rstrip())
-        parseCounter +=1
-
-        # Each Order in format: #NumProductsInOrder 1 .. N Products IDs
-        self.orders = []
-        self.productInventory = dict.fromkeys([i+1 for i in range(self.numProds)], 0)
-        oid = 1
-        for i in range(parseCounter, parseCounter + self.numOrders):
-            line = lines[i].rstrip().split()
-            nProd = int(line[0])
-            prods = [int(j) for j in line[1:]]
-            for p in prods:
-                self.productInventory[p] += 1
-            self.orders.append(Order(oid, nProd, prods))
-            oid +=1
+#The instance parser is shared with the other tools at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from wpsinstance import readInstance, IncorrectFormat
+from wpsbatch import batchSolve
+from wpsgreedy import ListScheduler
+
+class TimeWindow:
+    #Literals of the consecutive times lo..hi, numbered consecutively from base. Reads like the {time: literal}
+    #dicts the constraints were written against, without storing anything per literal
+    __slots__ = ['base', 'lo', 'hi']
+
+    def __init__(self, base, lo, hi):
+        self.base = base
+        self.lo = lo
+        self.hi = hi
+
+    def get(self, t, default = None):
+        if self.lo <= t <= self.hi:
+            return self.base + t - self.lo
+        return default
+
+    def __getitem__(self, t):
+        if self.lo <= t <= self.hi:
+            return self.base + t - self.lo
+        raise KeyError(t)
+
+    def __contains__(self, t):
+        return self.lo <= t <= self.hi
+
+    def __len__(self):
+        return max(0, self.hi - self.lo + 1)
+
+    def keys(self):
+        return range(self.lo, self.hi + 1)
+
+    def values(self):
+        return range(self.base, self.base + len(self))
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+class HardClauses:
+    #Collects the clauses added by the constraint methods as the hard part of a WCNF
+    def __init__(self):
+        self.wcnf = WCNF()
+
+    def add_clause(self, clause):
+        self.wcnf.append(clause)
+
+    def nof_vars(self):
+        return self.wcnf.nv
+
+    def nof_clauses(self):
+        return len(self.wcnf.hard) + len(self.wcnf.soft)
+
+    def delete(self):
+        self.wcnf = WCNF()
+
+def waitAndInterrupt(solver, cancel, done):
+    while not done.is_set():
+        if cancel.wait(0.05):
+            try:
+                solver.interrupt()
+            except NotImplementedError:
+                pass
+            return
+
+def portfolioWorker(name, seed, clauses, conn, cancel):
+    #Runs in its own process, keeping one incremental solver and answering the solve requests of a Portfolio
+    solver = Solver(name = name, bootstrap_with = clauses)
+    if seed > 0:
+        rand = random.Random(seed)
+        try:
+            solver.set_phases([v if rand.random() < 0.5 else -v for v in range(1, solver.nof_vars()+1)])
+        except NotImplementedError:
+            pass
+
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        newClauses, assumptions = msg
+        for c in newClauses:
+            solver.add_clause(c)
+
+        #A cancel set after the last answer was already sent is stale, it must not interrupt this solve
+        cancel.clear()
+
+        done = threading.Event()
+        watcher = threading.Thread(target = waitAndInterrupt, args = (solver, cancel, done))
+        try:
+            watcher.start()
+            res = solver.solve_limited(assumptions = assumptions, expect_interrupt = True)
+            solver.clear_interrupt()
+        except NotImplementedError:
+            #No interrupt() support (CaDiCaL, Lingeling), the portfolio terminates the process instead
+            done.set()
+            res = solver.solve(assumptions = assumptions)
+        done.set()
+        watcher.join()
+
+        if res is True:
+            conn.send((True, solver.get_model()))
+        elif res is False:
+            try:
+                core = solver.get_core()
+            except NotImplementedError:
+                core = None
+            conn.send((False, core))
+        else:
+            conn.send((None, None))
+    solver.delete()
+
+class Portfolio:
+    #Same interface as the pysat solvers used by the search drivers, but every solve call races
+    #several backends (e.g. "g4", or "g4:3" for random initial phases with seed 3) in separate processes
+    def __init__(self, backends, logFile = None):
+        self.backends = backends
+        self.logFile = logFile
+        self.clauses = []
+        self.workers = dict()
+        self.sent = dict()
+        self.model = None
+        self.core = None
+        self.table = dict()
+        for spec in self.backends:
+            self.table[spec] = {'wins': 0, 'losses': 0}
+
+    def add_clause(self, clause):
+        self.clauses.append(list(clause))
+
+    def startWorker(self, spec):
+        name, seed = (spec.split(':') + ['0'])[:2]
+        conn, childConn = multiprocessing.Pipe()
+        cancel = multiprocessing.Event()
+        proc = multiprocessing.Process(target = portfolioWorker, args = (name, int(seed), self.clauses, childConn, cancel))
+        proc.daemon = True
+        proc.start()
+        self.workers[spec] = (proc, conn, cancel)
+        self.sent[spec] = len(self.clauses)
+
+    def stopWorker(self, spec):
+        proc, conn, cancel = self.workers.pop(spec)
+        proc.terminate()
+        proc.join()
+        conn.close()
+
+    def solve(self, assumptions = []):
+        conns = dict()
+        for spec in self.backends:
+            if spec not in self.workers:
+                self.startWorker(spec)
+            proc, conn, cancel = self.workers[spec]
+            conn.send((self.clauses[self.sent[spec]:], assumptions))
+            self.sent[spec] = len(self.clauses)
+            conns[conn] = spec
+
+        winner = None
+        result = None
+        while winner is None and len(conns) > 0:
+            for conn in wait(list(conns)):
+                spec = conns.pop(conn)
+                try:
+                    res, payload = conn.recv()
+                except EOFError:
+                    self.stopWorker(spec)
+                    continue
+                if winner is None and res is not None:
+                    winner = spec
+                    result = res
+                    self.model = payload if res else None
+                    self.core = payload if not res else None
+
+        #Cancel the losers, killing the ones that can not be interrupted
+        for conn in conns:
+            self.workers[conns[conn]][2].set()
+        for conn in conns:
+            spec = conns[conn]
+            if conn.poll(1):
+                conn.recv()
+            else:
+                self.stopWorker(spec)
+
+        for spec in self.table:
+            if spec == winner:
+                self.table[spec]['wins'] += 1
+            else:
+                self.table[spec]['losses'] += 1
+        return result
+
+    def get_model(self):
+        return self.model
+
+    def get_core(self):
+        return self.core
+
+    def nof_vars(self):
+        return max([abs(l) for c in self.clauses for l in c] + [0])
+
+    def nof_clauses(self):
+        return len(self.clauses)
+
+    def saveTable(self):
+        #Adds this portfolio's wins and losses to the ones already in the log file
+        table = dict()
+        try:
+            with open(self.logFile) as f:
+                table = json.load(f)
+        except (OSError, ValueError):
+            pass
+        for spec in self.table:
+            entry = table.setdefault(spec, {'wins': 0, 'losses': 0})
+            entry['wins'] += self.table[spec]['wins']
+            entry['losses'] += self.table[spec]['losses']
+        with open(self.logFile, 'w') as f:
+            json.dump(table, f, indent = 2, sort_keys = True)
+
+    def delete(self):
+        for spec in list(self.workers):
+            proc, conn, cancel = self.workers[spec]
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            proc.join(1)
+            self.stopWorker(spec)
+        if self.logFile is not None and sum([e['wins'] for e in self.table.values()]) > 0:
+            self.saveTable()
+            self.table = dict((spec, {'wins': 0, 'losses': 0}) for spec in self.backends)
+
+class ClauseRecorder:
+    #Stands in for the solver while encoding, keeping the clauses so they can be written to the encoding cache
+    def __init__(self):
+        self.clauses = []
+        self.add_clause = self.clauses.append
+
+    def delete(self):
+        self.clauses = []
+
+class EncodingCache:
+    #Directory of encoded CNFs, one entry per (instance hash, timebound, encoding options). Each entry holds int32 .npy arrays
+    #that can be memory-mapped: the literals of every clause grouped by clause length, the (length, count) of each group,
+    #and the variable layout needed to decode models. The least recently used entries are removed above maxBytes
+    sourceHash = None
+    chunk = 1 << 16
+
+    def __init__(self, directory, maxBytes):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        os.makedirs(directory, exist_ok = True)
+        if EncodingCache.sourceHash is None:
+            #Entries written by a different version of the encoder are never reused
+            with open(os.path.abspath(__file__), 'rb') as f:
+                EncodingCache.sourceHash = hashlib.sha256(f.read()).hexdigest()
+
+    def key(self, p, maxTime, parts):
+        options = {'source': self.sourceHash, 'instance': p.instanceHash, 'timebound': maxTime, 'parts': parts}
+        options.update(p.encodingOptions())
+        return hashlib.sha256(json.dumps(options, sort_keys = True).encode()).hexdigest()
+
+    def load(self, p, maxTime, parts):
+        path = os.path.join(self.directory, self.key(p, maxTime, parts))
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+            arrays = dict((name, np.load(os.path.join(path, name + '.npy'), mmap_mode = 'r')) for name in ['lits', 'groups', 'xWindows', 'pWindows', 'H', 'D'])
+        except (OSError, ValueError):
+            return False
+
+        p.computeTimeWindows(maxTime)
+        p.setLayout(arrays['xWindows'], arrays['pWindows'], arrays['H'], arrays['D'], maxTime)
+        p.pool = IDPool(start_from = meta['top'] + 1)
+        self.addClauses(p.solver, arrays['lits'], arrays['groups'])
+        os.utime(path)
+        return True
+
+    def addClauses(self, solver, lits, groups):
+        #Clauses of the same length are contiguous, so each chunk turns into Python lists with a single tolist()
+        pos = 0
+        for length, count in groups.tolist():
+            block = lits[pos:pos + length*count].reshape(count, length)
+            for i in range(0, count, self.chunk):
+                for clause in block[i:i + self.chunk].tolist():
+                    solver.add_clause(clause)
+            pos += length*count
+
+    def store(self, p, maxTime, parts, clauses):
+        #Writes the entry and returns the order in which the clauses were stored, so that the caller can add them to the solver in the same order as a later cache hit
+        lengths = np.fromiter(map(len, clauses), dtype = np.int64, count = len(clauses))
+        flat = np.fromiter(itertools.chain.from_iterable(clauses), dtype = np.int32, count = int(lengths.sum()))
+        starts = np.cumsum(lengths) - lengths
+        order = np.argsort(lengths, kind = 'stable')
+        lits = []
+        groups = []
+        for length in np.unique(lengths).tolist():
+            idx = order[lengths[order] == length]
+            lits.append(flat[(starts[idx][:, None] + np.arange(length)).ravel()])
+            groups.append((length, len(idx)))
+
+        arrays = dict(zip(['xWindows', 'pWindows', 'H', 'D'], p.getLayout()))
+        arrays['lits'] = np.concatenate(lits) if len(lits) > 0 else np.zeros(0, dtype = np.int32)
+        arrays['groups'] = np.array(groups, dtype = np.int32).reshape(-1, 2)
+
+        tmp = tempfile.mkdtemp(dir = self.directory, prefix = '.tmp')
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp, name + '.npy'), array)
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump({'timebound': maxTime, 'parts': parts, 'top': p.pool.top, 'clauses': len(clauses)}, f)
+            os.rename(tmp, os.path.join(self.directory, self.key(p, maxTime, parts)))
+        except OSError:
+            #Another process stored the same entry first
+            shutil.rmtree(tmp, ignore_errors = True)
+        self.evict()
+        return order
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            try:
+                size = sum([os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)])
+                entries.append((os.path.getmtime(path), size, path))
+            except OSError:
+                continue
+
+        total = sum([e[1] for e in entries])
+        #The most recent entry is kept even when it is larger than the cap on its own
+        for mtime, size, path in sorted(entries)[:-1]:
+            if total <= self.maxBytes:
+                break
+            shutil.rmtree(path, ignore_errors = True)
+            total -= size
+
+#Cardinality encodings that can be chosen for each call site. Those marked None only encode bounds of 1,
+#and larger bounds fall back to the sequential counter
+cardEncodings = {
+    'pairwise': EncType.pairwise,
+    'ladder': EncType.ladder,
+    'bitwise': EncType.bitwise,
+    'kproduct': None,
+    'seqcounter': EncType.seqcounter,
+    'totalizer': EncType.totalizer,
+    'kmtotalizer': EncType.kmtotalizer,
+    'cardnetwork': EncType.cardnetwrk,
+    'sortnetwork': EncType.sortnetwrk,
+}
+cardinalitySites = ['runnerInitialTimesActive', 'orderConstraint', 'packagingAreaConstraint', 'productTransitionsConstraint',
+                    'runnerOneProductAtATime', 'productArrivingPackaging']
+
+def productAtMostOne(literals, pool):
+    #Chen's 2-product at-most-one: the literals are laid on a grid, each one implies its row and column variable,
+    #and at most one row and one column are allowed, recursively
+    if len(literals) <= 4:
+        return [[-literals[i], -literals[j]] for i in range(len(literals)) for j in range(i+1, len(literals))]
+    rows = math.ceil(math.sqrt(len(literals)))
+    cols = math.ceil(len(literals)/rows)
+    U = [pool.id() for _ in range(rows)]
+    V = [pool.id() for _ in range(cols)]
+    clauses = []
+    for k, l in enumerate(literals):
+        clauses.append([-l, U[k//cols]])
+        clauses.append([-l, V[k%cols]])
+    return clauses + productAtMostOne(U, pool) + productAtMostOne(V, pool)
+
+def autoCardEncoding(n, bound):
+    #Pairwise while it is tiny, then the sequential counter (arc consistent, linear), and for long lists the
+    #product encoding (about 2n clauses and 2*sqrt(n) variables) or the k-min totalizer for larger bounds
+    if bound == 1:
+        if n <= 6:
+            return 'pairwise'
+        return 'seqcounter' if n <= 64 else 'kproduct'
+    if n*min(bound, n-bound) <= 5000:
+        return 'seqcounter'
+    return 'kmtotalizer'
+
+#Sizes (vars, clauses, literals) of the pysat cardinality encodings used below, for the dry-run estimate
+def atMostOnePairwiseSize(n):
+    return 0, n*(n-1)//2, n*(n-1)
+
+def exactlyOnePairwiseSize(n):
+    if n == 0:
+        return 0, 1, 0
+    return 0, n*(n-1)//2 + 1, n*(n-1) + n
+
+def atMostSeqCounterSize(n, k):
+    if k >= n:
+        return 0, 0, 0
+    if k == 0:
+        return 0, n, n
+    if k == n-1:
+        return 0, 1, n
+    return (n-k)*k, (2*k+1)*n - 2*k*(k+1), 5*n*k + n - 5*k*k - 3*k
+
+def lexLeaderSize(n):
+    if n == 0:
+        return 0, 0, 0
+    if n == 1:
+        return 0, 1, 2
+    return n-1, 3*n-2, 10*n-10
+
+sizeCache = dict()
+def cardinalitySize(encoding, kind, n, bound):
+    #Size of an encoding, from the closed forms when there is one, otherwise by encoding n dummy literals once
+    if kind == 'equals' and n == 0:
+        return 0, 1, 0
+    if encoding == 'pairwise' and bound == 1:
+        return exactlyOnePairwiseSize(n) if kind == 'equals' else atMostOnePairwiseSize(n)
+    if encoding == 'seqcounter':
+        size = atMostSeqCounterSize(n, bound)
+        if kind == 'equals':
+            other = atMostSeqCounterSize(n, n-bound)
+            size = (size[0] + other[0], size[1] + other[1], size[2] + other[2])
+        return size
+    key = (encoding, kind, n, bound)
+    if key not in sizeCache:
+        pool = IDPool(start_from = n+1)
+        clauses = cardinalityClauses(encoding, kind, list(range(1, n+1)), bound, pool)
+        sizeCache[key] = (pool.top - n, len(clauses), sum([len(c) for c in clauses]))
+    return sizeCache[key]
+
+def cardinalityClauses(encoding, kind, literals, bound, pool):
+    #Clauses of sum(literals) <= bound (kind 'atmost') or == bound (kind 'equals'), with aux variables taken from pool
+    if kind == 'equals' and len(literals) == 0:
+        return [[]]
+    if encoding == 'kproduct':
+        clauses = productAtMostOne(literals, pool)
+        if kind == 'equals':
+            clauses.append(list(literals))
+        return clauses
+    build = CardEnc.equals if kind == 'equals' else CardEnc.atmost
+    return build(literals, bound = bound, vpool = pool, encoding = cardEncodings[encoding]).clauses
+
+class Problem(ListScheduler):
+    def __init__(self, instance):
+        #instance - a wpsinstance.Instance, see readInstance
+        self.instanceHash = instance.digest
+        self.numRunners = instance.numRunners
+        self.numProds = instance.numProds
+        self.numOrders = instance.numOrders
+        self.runners = instance.runners()
+        self.products = instance.products()
+        self.orders = instance.orders()
+        self.shelvesTimes = instance.shelvesTimes
+        self.productInventory = dict((j+1, instance.inventory[j]) for j in range(self.numProds))
 
         # ------------------ #
         # Encoding Variables #
         # -------------------#
         self.X = dict()
-        self.translate_X = dict()
-
         self.P = dict()
-        self.translate_P = dict()
-
         self.A = dict()
-        self.translate_A = dict()
+        self.numX = 0
+        self.numP = 0
+
+        self.H = []
+
+        self.D = dict()
+        self.translate_D = dict()
+
+        # ------------------ #
+        # Encoding Options   #
+        # -------------------#
+        self.busyEncoding = 'ternary'
+        self.pruneWindows = True
+        self.symmetryBreaking = True
+        #Last known schedule, whose assignment every new encoding prefers (see installPhases)
+        self.warmStart = True
+        self.phaseHint = None
+        self.greedyRestarts = 100
+        self.portfolio = None
+        self.portfolioLog = None
+        self.cache = None
+        #Cardinality encoding of each call site ('*' for the rest), a name from cardEncodings or 'auto'
+        self.cardEncoding = {'orderConstraint': 'seqcounter', '*': 'pairwise'}
 
         self.solver = Glucose4()
-        self.topLit = 0
+        self.pool = IDPool()
 
-    def createVariables(self, maxTime):
-        self.X = dict()
-        self.translate_X = dict()
+    def newSolver(self):
+        #Releases the current solver and creates an empty one
+        self.solver.delete()
+        if self.portfolio is not None:
+            self.solver = Portfolio(self.portfolio, self.portfolioLog)
+        else:
+            self.solver = Glucose4()
+
+    def shortestShelvesTimes(self):
+        #All-pairs shortest travel times between shelves (paths with at least one move)
+        dist = [list(st) for st in self.shelvesTimes]
+        for k in range(self.numProds):
+            for i in range(self.numProds):
+                for j in range(self.numProds):
+                    if dist[i][k] + dist[k][j] < dist[i][j]:
+                        dist[i][j] = dist[i][k] + dist[k][j]
+        return dist
+
+    def computeTimeWindows(self, maxTime):
+        #earliestPick[r][p] - first time runner r can be carrying product p
+        #latestPick[p] - last time product p can be picked and still arrive before maxTime
+        #earliestArrival[p] - first time product p can arrive to the packaging area
+        self.earliestPick = dict()
+        self.latestPick = dict()
+        self.earliestArrival = dict()
+
+        if not self.pruneWindows:
+            for r in self.runners:
+                self.earliestPick[r.id] = dict.fromkeys([p.id for p in self.products], 0)
+            for p in self.products:
+                self.latestPick[p.id] = maxTime-1
+                self.earliestArrival[p.id] = 0
+            return
 
-        self.P = dict()
-        self.translate_P = dict()
+        dist = self.shortestShelvesTimes()
+        for r in self.runners:
+            self.earliestPick[r.id] = dict()
+            for p in self.products:
+                self.earliestPick[r.id][p.id] = dist[r.initialPos-1][p.id-1]
 
-        self.A = dict()
-        self.translate_A = dict()
+        for p in self.products:
+            self.latestPick[p.id] = maxTime-1 - p.beltTime
+            self.earliestArrival[p.id] = min([self.earliestPick[r.id][p.id] for r in self.runners]) + p.beltTime
+
+    def createVariables(self, maxTime):
+        #Only times inside the reachability windows get a variable, the others are known to be false
+        self.computeTimeWindows(maxTime)
+        xWindows = [(self.earliestPick[r][p], self.latestPick[p]) for r in range(1, self.numRunners+1) for p in range(1, self.numProds+1)]
+        pWindows = [(self.earliestArrival[p], maxTime-1) for p in range(1, self.numProds+1)]
+        self.numberVariables(np.array(xWindows, dtype = np.int64), np.array(pWindows, dtype = np.int64), maxTime)
+        self.pool = IDPool(start_from = self.numX + self.numP + self.numRunners*maxTime + 1)
+
+    def numberVariables(self, xWindows, pWindows, maxTime):
+        #Literals are numbered arithmetically in blocks of consecutive times: X by runner and product, then P by
+        #product, then A by runner. xBase/pBase hold the first literal of each block, for decoding models
+        xLen = np.maximum(xWindows[:, 1] - xWindows[:, 0] + 1, 0)
+        self.xBase = np.cumsum(xLen) - xLen + 1
+        self.xLo = xWindows[:, 0]
+        self.numX = int(xLen.sum())
+
+        pLen = np.maximum(pWindows[:, 1] - pWindows[:, 0] + 1, 0)
+        self.pBase = np.cumsum(pLen) - pLen + self.numX + 1
+        self.pLo = pWindows[:, 0]
+        self.numP = int(pLen.sum())
 
-        lit = 1
+        self.X = dict()
         for i in range(1, self.numRunners+1):
             self.X[i] = dict()
             for p in range(1, self.numProds+1):
-                self.X[i][p] = list()
-                for t in range(maxTime):
-                    self.X[i][p].append(lit)
-                    self.translate_X[lit] = (i, p, t)
-                    lit += 1
+                b = (i-1)*self.numProds + p-1
+                self.X[i][p] = TimeWindow(int(self.xBase[b]), int(xWindows[b, 0]), int(xWindows[b, 1]))
 
+        self.P = dict()
         for p in range(1, self.numProds+1):
-            self.P[p] = list()
-            for t in range(maxTime):
-                self.P[p].append(lit)
-                self.translate_P[lit] = (p, t)
-                lit +=1
+            self.P[p] = TimeWindow(int(self.pBase[p-1]), int(pWindows[p-1, 0]), int(pWindows[p-1, 1]))
 
+        aBase = self.numX + self.numP + 1
+        self.A = dict()
         for r in range(1, self.numRunners+1):
-            self.A[r] = list()
-            for t in range(maxTime):
-                self.A[r].append(lit)
-                self.translate_A[lit] = (r, t)
-                lit +=1
-        self.topLit = lit
+            self.A[r] = range(aBase + (r-1)*maxTime, aBase + r*maxTime)
+
+    def getLayout(self):
+        #Variable layout as int32 arrays: (lo, hi) time window of each X block and each P block, H and rows (product, time, lit) of D
+        xWindows = np.array([(w.lo, w.hi) for i in range(1, self.numRunners+1) for w in self.X[i].values()], dtype = np.int32).reshape(-1, 2)
+        pWindows = np.array([(w.lo, w.hi) for w in self.P.values()], dtype = np.int32).reshape(-1, 2)
+        H = np.array(self.H, dtype = np.int32)
+        D = np.array([(p, t, l) for l, (p, t) in self.translate_D.items()], dtype = np.int32).reshape(-1, 3)
+        return xWindows, pWindows, H, D
+
+    def setLayout(self, xWindows, pWindows, H, D, maxTime):
+        #Inverse of getLayout, used instead of createVariables when an encoding comes from the cache
+        self.numberVariables(np.array(xWindows, dtype = np.int64), np.array(pWindows, dtype = np.int64), maxTime)
+        self.H = H.tolist()
+
+        self.D = dict()
+        self.translate_D = dict()
+        for p, t, l in sorted(D.tolist()):
+            self.D.setdefault(p, []).append(l)
+            self.translate_D[l] = (p, t)
+
+    def setCardEncoding(self, choice):
+        #A choice for every call site ('*') replaces the defaults, per-site choices only override them
+        if '*' in choice:
+            self.cardEncoding = dict(choice)
+        else:
+            self.cardEncoding.update(choice)
+
+    def chooseCardEncoding(self, site, n, bound):
+        encoding = self.cardEncoding.get(site, self.cardEncoding.get('*', 'auto'))
+        if encoding == 'auto':
+            encoding = autoCardEncoding(n, bound)
+        if bound != 1 and cardEncodings[encoding] in [None, EncType.pairwise, EncType.ladder, EncType.bitwise]:
+            encoding = 'seqcounter'
+        return encoding
+
+    def cardinality(self, site, literals, bound, kind):
+        #Clauses of a cardinality constraint, encoded as configured for the call site
+        return cardinalityClauses(self.chooseCardEncoding(site, len(literals), bound), kind, literals, bound, self.pool)
+
+    def cardinalitySize(self, site, n, bound, kind):
+        return cardinalitySize(self.chooseCardEncoding(site, n, bound), kind, n, bound)
 
     def runnerPercentages(self, maxTime):
         #1 - A runner cannot spend less than 50% of the max timespan amongst other runners
@@ -137,19 +640,19 @@ class Problem:
             literals = []
             for j in self.products:
                 stime = self.shelvesTimes[r.initialPos-1][j.id-1]
-                if(stime < maxTime):
-                    literals.append(self.X[r.id][j.id][stime])
+                l = self.X[r.id][j.id].get(stime)
+                if l is None:
+                    continue
+                literals.append(l)
 
                 #If a runner goes to prod j at time stime, then it does not carry any other product in times [0, k+stime[
                 for j1 in self.products:
                     for t in range(1, stime):
-                        if(stime < maxTime):
-                            self.solver.add_clause([-self.X[r.id][j.id][stime], -self.X[r.id][j1.id][t]])           
+                        l2 = self.X[r.id][j1.id].get(t)
+                        if l2 is not None:
+                            self.solver.add_clause([-l, -l2])
             
-            enc = CardEnc.equals(literals, bound = 1, top_id = self.topLit, encoding=EncType.pairwise)
-            if len(enc.clauses) > 0:
-                self.topLit = max([self.topLit] + [max(c) for c in enc.clauses if len(c) > 0])
-            for c in enc.clauses:
+            for c in self.cardinality('runnerInitialTimesActive', literals, 1, 'equals'):
                 c.append(-l1)
                 self.solver.add_clause(c)
         
@@ -165,66 +668,101 @@ class Problem:
     def orderConstraint(self):
         for p in self.products:
             qty = self.productInventory[p.id]
-            enc = CardEnc.equals(self.P[p.id][1:], bound = qty, top_id = self.topLit)
-            if len(enc.clauses) > 0:
-                    self.topLit = max([self.topLit] + [max(c) for c in enc.clauses if len(c) > 0])
-            for clause in enc.clauses:
+            literals = [l for t, l in self.P[p.id].items() if t >= 1]
+            if len(literals) < qty:
+                #Not enough arrival times left for every ordered unit
+                self.solver.add_clause([])
+                continue
+            for clause in self.cardinality('orderConstraint', literals, qty, 'equals'):
                 self.solver.add_clause(clause) 
 
     def packagingAreaConstraint(self, maxTime):
         for k in range(1, maxTime):
-            literals = [p[k] for p in self.P.values()]
-            enc = CardEnc.atmost(literals, bound = 1, top_id = self.topLit, encoding=EncType.pairwise)
-            if len(enc.clauses) > 0:
-                    self.topLit = max([self.topLit] + [max(c) for c in enc.clauses if len(c) > 0])
-            for clause in enc.clauses:
+            literals = [p[k] for p in self.P.values() if k in p]
+            for clause in self.cardinality('packagingAreaConstraint', literals, 1, 'atmost'):
                 self.solver.add_clause(clause)
            
     def conveyorBeltConstraint(self, maxTime):
         for r in self.runners:
             for j in self.products:
-                for k in range(1, maxTime):
-                    if (k+j.beltTime) < maxTime:
-                        self.solver.add_clause([-self.X[r.id][j.id][k], self.P[j.id][k+j.beltTime]])
+                for k, l1 in self.X[r.id][j.id].items():
+                    if k < 1:
+                        continue
+                    l2 = self.P[j.id].get(k+j.beltTime)
+                    if l2 is not None:
+                        self.solver.add_clause([-l1, l2])
                     else:
-                        self.solver.add_clause([-self.X[r.id][j.id][k]]) #TODO check this condition
+                        self.solver.add_clause([-l1]) #TODO check this condition
+
+    def picksAt(self, r, maxTime):
+        #X literals of runner r at each time, in product order
+        picks = [[] for _ in range(maxTime)]
+        for window in self.X[r].values():
+            for t, l in window.items():
+                picks[t].append(l)
+        return picks
 
     def runnerOneProductAtATime(self, maxTime):
         for r in self.runners:
+            picks = self.picksAt(r.id, maxTime)
             for k in range(maxTime):
-                literals = [p[k] for p in self.X[r.id].values()]
-                enc = CardEnc.atmost(literals, bound = 1, top_id=self.topLit, encoding=EncType.pairwise)
-                for clause in enc.clauses:
+                literals = picks[k]
+                for clause in self.cardinality('runnerOneProductAtATime', literals, 1, 'atmost'):
                     self.solver.add_clause(clause)
 
     def runnerIsBusyConstraint(self, maxTime):
         for r in self.runners:
+            picks = self.picksAt(r.id, maxTime)
             for j in self.products:
-                for k in range(maxTime):
-                    l1 = self.X[r.id][j.id][k]
-
+                for k, l1 in self.X[r.id][j.id].items():
                     for j1 in self.products:
                         time = self.shelvesTimes[j.id-1][j1.id-1]
-                        if (k+time) < maxTime:
-                            l2 = self.X[r.id][j1.id][k+time]
-                            lits = []
-                            for t in range(k+1, k+time):
-                                for p in self.products:
-                                    lits.append(self.X[r.id][p.id][t]) 
+                        l2 = self.X[r.id][j1.id].get(k+time)
+                        if l2 is not None:
+                            lits = [l for t in range(k+1, k+time) for l in picks[t]]
                             for l in lits:
                                 #self.printClause([-l1, -l2, -l])
                                 self.solver.add_clause([-l1, -l2, -l])
 
+    def runnerInTransitConstraint(self, maxTime):
+        #8 - Compact version of runnerIsBusyConstraint
+        #C[t][e] - the runner is travelling at time t and reaches its next product at time t+e
+        #W[t] - the runner is travelling at time t, so it does not carry any product
+        maxStime = max([max(st) for st in self.shelvesTimes])
+        for r in self.runners:
+            C = dict()
+            W = dict()
+            for t in range(1, maxTime):
+                for e in range(1, min(maxStime, maxTime-t)):
+                    C[(t, e)] = self.pool.id(('C', r.id, t, e))
+                W[t] = self.pool.id(('W', r.id, t))
+
+            picks = self.picksAt(r.id, maxTime)
+            for t in range(1, maxTime):
+                for l in picks[t]:
+                    self.solver.add_clause([-W[t], -l])
+                for e in range(1, min(maxStime, maxTime-t)):
+                    self.solver.add_clause([-C[(t, e)], W[t]])
+                    if e > 1:
+                        self.solver.add_clause([-C[(t, e)], C[(t+1, e-1)]])
+
+            for j in self.products:
+                for k, l1 in self.X[r.id][j.id].items():
+                    for j1 in self.products:
+                        time = self.shelvesTimes[j.id-1][j1.id-1]
+                        l2 = self.X[r.id][j1.id].get(k+time)
+                        if time > 1 and l2 is not None:
+                            self.solver.add_clause([-l1, -l2, C[(k+1, time-1)]])
+
     def productTransitionsConstraint(self, maxTime):
         for r in self.runners:
             for j in self.products:
-                for k in range(maxTime):
-                    l1 = self.X[r.id][j.id][k]
+                for k, l1 in self.X[r.id][j.id].items():
                     literals = []
                     for j1 in self.products:
                         time = self.shelvesTimes[j.id-1][j1.id-1]
-                        if (k+time) < maxTime:
-                            l2 = self.X[r.id][j1.id][k+time]
+                        l2 = self.X[r.id][j1.id].get(k+time)
+                        if l2 is not None:
                             literals.append(l2)
                     
                     #6 - A runner can also stop being active
@@ -232,10 +770,7 @@ class Problem:
                         literals.append(-self.A[r.id][k+1])
 
                     if(len(literals) > 0):
-                        enc = CardEnc.equals(literals, top_id = self.topLit, encoding=EncType.pairwise)
-                        if len(enc.clauses) > 0:
-                                self.topLit = max([self.topLit] + [max(c) for c in enc.clauses if len(c) > 0])
-                        for c in enc.clauses:
+                        for c in self.cardinality('productTransitionsConstraint', literals, 1, 'equals'):
                             c.append(-l1)
                             self.solver.add_clause(c)
                    
@@ -245,16 +780,44 @@ class Problem:
 
     def productArrivingPackaging(self, maxTime):
         for p in self.products:
-            for k in range(maxTime):
+            for k, l in self.P[p.id].items():
                 if(k-p.beltTime > 0):
-                    l = self.P[p.id][k]
-                    runnerLits = [self.X[i][p.id][k-p.beltTime] for i in range(1, self.numRunners+1)]
-                    enc = CardEnc.equals(runnerLits, bound = 1, top_id = self.topLit, encoding=EncType.pairwise)
-                    for c in enc.clauses:
+                    runnerLits = [self.X[i][p.id][k-p.beltTime] for i in range(1, self.numRunners+1) if (k-p.beltTime) in self.X[i][p.id]]
+                    for c in self.cardinality('productArrivingPackaging', runnerLits, 1, 'equals'):
                         c.append(-l)
                         self.solver.add_clause(c)
                 else:
-                    self.solver.add_clause([-self.P[p.id][k]])
+                    self.solver.add_clause([-l])
+
+    def symmetricRunners(self):
+        #Pairs of consecutive runners starting at the same shelf, whose schedules can be swapped in any solution
+        groups = dict()
+        for r in self.runners:
+            groups.setdefault(r.initialPos, []).append(r.id)
+        return [(g[i], g[i+1]) for g in groups.values() for i in range(len(g)-1)]
+
+    def runnerSignature(self, r, maxTime):
+        #Picks of runner r in time order followed by its activity. Runners starting at the same shelf have the same
+        #time windows, so their signatures line up position by position. Putting the picks first compares the runners
+        #on their first moves, which prunes the search much better than comparing how long they stay active
+        picks = self.picksAt(r, maxTime)
+        return [l for t in range(maxTime) for l in picks[t]] + list(self.A[r])
+
+    def runnerSymmetryBreaking(self, maxTime):
+        #12 - Of two runners starting at the same shelf, the first one has the lexicographically larger signature
+        #S[i] - both signatures are equal up to position i
+        for r1, r2 in self.symmetricRunners():
+            x = self.runnerSignature(r1, maxTime)
+            y = self.runnerSignature(r2, maxTime)
+            prefix = []
+            for i in range(len(x)):
+                self.solver.add_clause(prefix + [x[i], -y[i]])
+                if i == len(x)-1:
+                    break
+                s = self.pool.id(('S', r1, i))
+                self.solver.add_clause(prefix + [-x[i], -y[i], s])
+                self.solver.add_clause(prefix + [x[i], s])
+                prefix = [-s]
 
     def encodeConstraints(self, maxTime):
         #1 - A runner cannot spend less than 50% of the max timespan amongst other runners
@@ -273,7 +836,10 @@ class Problem:
         self.productTransitionsConstraint(maxTime)
 
         #8 - A runner i in prod j at time k that goes to prod j' at time k+stime does not carry any other prod in times ]k, k+stime[  
-        self.runnerIsBusyConstraint(maxTime)
+        if self.busyEncoding == 'transit':
+            self.runnerInTransitConstraint(maxTime)
+        else:
+            self.runnerIsBusyConstraint(maxTime)
 
         #9 - A product takes c_j time from the conveyor belt to the packaging area
         self.conveyorBeltConstraint(maxTime)
@@ -284,93 +850,390 @@ class Problem:
         #11 - If a product arrives to the packaging area, it was only placed by one runner
         self.productArrivingPackaging(maxTime)
 
+        #12 - Runners starting at the same shelf are interchangeable, only one ordering of their schedules is kept
+        if self.symmetryBreaking:
+            self.runnerSymmetryBreaking(maxTime)
+
+    def encodingOptions(self):
+        #Everything besides the instance and the timebound that changes the clauses produced
+        return {'busyEncoding': self.busyEncoding, 'pruneWindows': self.pruneWindows, 'cardEncoding': self.cardEncoding,
+                'symmetryBreaking': self.symmetryBreaking}
+
+    def encode(self, maxTime, horizon = False, deadlines = False):
+        #Creates the variables and adds the constraints for maxTime (and optionally the horizon and deadline literals) to
+        #the current solver. With an encoding cache, a stored encoding is loaded instead, and a new one is stored first
+        parts = [name for name, used in [('horizon', horizon), ('deadlines', deadlines)] if used]
+        if self.cache is not None:
+            if self.cache.load(self, maxTime, parts):
+                self.installPhases()
+                return
+            solver = self.solver
+            self.solver = ClauseRecorder()
+
+        self.createVariables(maxTime)
+        self.encodeConstraints(maxTime)
+        if horizon:
+            self.encodeHorizon(maxTime)
+        if deadlines:
+            self.encodeDeadlines(maxTime)
+
+        if self.cache is not None:
+            clauses = self.solver.clauses
+            self.solver = solver
+            #Same clause order as a later cache hit
+            for i in self.cache.store(self, maxTime, parts, clauses).tolist():
+                self.solver.add_clause(clauses[i])
+        self.installPhases()
+
+    def schedulePhases(self, schedule):
+        #Literals of the current encoding that are true in a schedule, its picks and their arrivals, in time order.
+        #Times outside the variable windows are left out
+        lits = []
+        for r, picks in schedule[1].items():
+            for (j, k) in picks:
+                for l in [self.X[r][j].get(k), self.P[j].get(k + self.products[j-1].beltTime)]:
+                    if l is not None:
+                        lits.append((k, l))
+        return [l for (k, l) in sorted(lits)]
+
+    def installPhases(self):
+        #The solver starts from the last known schedule. Its literals alone do not steer the search, the auxiliary
+        #variables decide first, so the part of the schedule that still fits the new encoding is propagated with phase
+        #saving, which leaves every implied variable preferring its value in that schedule. The whole schedule is tried at
+        #once and only the chunks that conflict are halved, in time order, so a schedule that still fits costs one call
+        if not (self.warmStart and self.phaseHint is not None and hasattr(self.solver, 'propagate')):
+            return
+        keep = []
+        chunks = [self.schedulePhases(self.phaseHint)]
+        while len(chunks) > 0:
+            chunk = chunks.pop()
+            if self.solver.propagate(assumptions = keep + chunk, phase_saving = 0)[0]:
+                keep += chunk
+            elif len(chunk) > 1:
+                chunks += [chunk[len(chunk)//2:], chunk[:len(chunk)//2]]
+        self.solver.propagate(assumptions = keep, phase_saving = 2)
+
+    def estimateEncoding(self, maxTime):
+        #Counts the variables, clauses and literals encodeConstraints(maxTime) would add per constraint family, without encoding anything
+        self.computeTimeWindows(maxTime)
+        sizes = dict()
+        def add(name, size, extraLits = 0):
+            entry = sizes.setdefault(name, [0, 0, 0])
+            entry[0] += size[0]
+            entry[1] += size[1]
+            entry[2] += size[2] + extraLits
+
+        #xCount[r][t] - number of X variables of runner r at time t, xSum[r][t] - number of them before time t
+        window = dict()
+        xCount = dict()
+        xSum = dict()
+        for r in self.runners:
+            diff = [0]*(maxTime+1)
+            for p in self.products:
+                lo, hi = self.earliestPick[r.id][p.id], self.latestPick[p.id]
+                window[(r.id, p.id)] = (lo, hi)
+                if lo <= hi:
+                    diff[lo] += 1
+                    diff[hi+1] -= 1
+            xCount[r.id] = [0]*maxTime
+            xSum[r.id] = [0]*(maxTime+1)
+            n = 0
+            for t in range(maxTime):
+                n += diff[t]
+                xCount[r.id][t] = n
+                xSum[r.id][t+1] = xSum[r.id][t] + n
+
+        def xBetween(r, a, b):
+            a, b = max(a, 0), min(b, maxTime-1)
+            return xSum[r][b+1] - xSum[r][a] if a <= b else 0
+
+        def nextPicks(r, j, j1):
+            #Times k of X[r][j] such that X[r][j1] exists at k+s[j][j1]
+            lo, hi = window[(r, j)]
+            lo1, hi1 = window[(r, j1)]
+            time = self.shelvesTimes[j-1][j1-1]
+            return max(lo, lo1-time), min(hi, hi1-time), time
+
+        numX = sum([max(0, hi-lo+1) for lo, hi in window.values()])
+        numP = sum([max(0, maxTime-self.earliestArrival[p.id]) for p in self.products])
+        add('createVariables', (numX + numP + self.numRunners*maxTime, 0, 0))
+
+        add('runnerPercentages', (0, self.numRunners*(self.numRunners-1)*maxTime, 2*self.numRunners*(self.numRunners-1)*maxTime))
+
+        for r in self.runners:
+            add('runnerInitialTimesActive', (0, 1, 1))
+            n = 0
+            for j in self.products:
+                stime = self.shelvesTimes[r.initialPos-1][j.id-1]
+                lo, hi = window[(r.id, j.id)]
+                if lo <= stime <= hi:
+                    n += 1
+                    busy = xBetween(r.id, 1, stime-1)
+                    add('runnerInitialTimesActive', (0, busy, 2*busy))
+            size = self.cardinalitySize('runnerInitialTimesActive', n, 1, 'equals')
+            add('runnerInitialTimesActive', size, size[1])
+            add('runnerInitialTimesActive', (0, 2*(maxTime-1), 4*(maxTime-1)))
+
+        for p in self.products:
+            qty = self.productInventory[p.id]
+            n = max(0, maxTime - max(1, self.earliestArrival[p.id]))
+            if n < qty:
+                add('orderConstraint', (0, 1, 0))
+            else:
+                add('orderConstraint', self.cardinalitySize('orderConstraint', n, qty, 'equals'))
+
+        arrivals = sorted([self.earliestArrival[p.id] for p in self.products])
+        n = 0
+        for k in range(1, maxTime):
+            while n < len(arrivals) and arrivals[n] <= k:
+                n += 1
+            add('packagingAreaConstraint', self.cardinalitySize('packagingAreaConstraint', n, 1, 'atmost'))
+
+        for r in self.runners:
+            for j in self.products:
+                lo, hi = window[(r.id, j.id)]
+                if lo > hi:
+                    continue
+                diff = [0]*(hi-lo+2)
+                for j1 in self.products:
+                    klo, khi, _ = nextPicks(r.id, j.id, j1.id)
+                    if klo <= khi:
+                        diff[klo-lo] += 1
+                        diff[khi-lo+1] -= 1
+                n = 0
+                for k in range(lo, hi+1):
+                    n += diff[k-lo]
+                    if n > 0 or k+1 < maxTime:
+                        size = self.cardinalitySize('productTransitionsConstraint', n + (1 if k+1 < maxTime else 0), 1, 'equals')
+                        add('productTransitionsConstraint', size, size[1])
+                    add('productTransitionsConstraint', (0, 1, 2))
+
+        if self.busyEncoding == 'transit':
+            maxStime = max([max(st) for st in self.shelvesTimes])
+            for r in self.runners:
+                numC = sum([max(0, min(maxStime, maxTime-t)-1) for t in range(1, maxTime)])
+                numChain = sum([max(0, min(maxStime, maxTime-t)-2) for t in range(1, maxTime)])
+                add('runnerInTransitConstraint', (numC + maxTime-1, 0, 0))
+                add('runnerInTransitConstraint', (0, xBetween(r.id, 1, maxTime-1) + numC + numChain, 2*(xBetween(r.id, 1, maxTime-1) + numC + numChain)))
+                for j in self.products:
+                    for j1 in self.products:
+                        klo, khi, time = nextPicks(r.id, j.id, j1.id)
+                        if time > 1 and klo <= khi:
+                            add('runnerInTransitConstraint', (0, khi-klo+1, 3*(khi-klo+1)))
+        else:
+            for r in self.runners:
+                #xSumSum[i] - sum of xSum[r][m] for m < i, so the picks in ]k, k+time[ can be summed over an interval of k
+                xSumSum = [0]*(maxTime+2)
+                for i in range(maxTime+1):
+                    xSumSum[i+1] = xSumSum[i] + xSum[r.id][i]
+                for j in self.products:
+                    for j1 in self.products:
+                        klo, khi, time = nextPicks(r.id, j.id, j1.id)
+                        if time > 1 and klo <= khi:
+                            n = (xSumSum[khi+time+1] - xSumSum[klo+time]) - (xSumSum[khi+2] - xSumSum[klo+1])
+                            add('runnerIsBusyConstraint', (0, n, 3*n))
+
+        for r in self.runners:
+            for j in self.products:
+                lo, hi = window[(r.id, j.id)]
+                lo = max(lo, 1)
+                if lo > hi:
+                    continue
+                binary = max(0, min(hi, maxTime-1-j.beltTime) - max(lo, self.earliestArrival[j.id]-j.beltTime) + 1)
+                add('conveyorBeltConstraint', (0, hi-lo+1, binary + hi-lo+1))
+
+        for r in self.runners:
+            for t in range(maxTime):
+                add('runnerOneProductAtATime', self.cardinalitySize('runnerOneProductAtATime', xCount[r.id][t], 1, 'atmost'))
+
+        for p in self.products:
+            diff = [0]*(maxTime+1)
+            for r in self.runners:
+                lo, hi = window[(r.id, p.id)]
+                lo, hi = lo+p.beltTime, min(hi+p.beltTime, maxTime-1)
+                if lo <= hi:
+                    diff[lo] += 1
+                    diff[hi+1] -= 1
+            n = 0
+            for k in range(maxTime):
+                n += diff[k]
+                if k < self.earliestArrival[p.id]:
+                    continue
+                if k-p.beltTime > 0:
+                    size = self.cardinalitySize('productArrivingPackaging', n, 1, 'equals')
+                    add('productArrivingPackaging', size, size[1])
+                else:
+                    add('productArrivingPackaging', (0, 1, 1))
+
+        if self.symmetryBreaking:
+            for r1, r2 in self.symmetricRunners():
+                add('runnerSymmetryBreaking', lexLeaderSize(maxTime + xBetween(r1, 0, maxTime-1)))
+
+        return [(name, vars, clauses, lits) for name, (vars, clauses, lits) in sizes.items()]
+
+    def estimateMemory(self, sizes):
+        #Rough footprint in bytes of the encoding: the solver's per-variable data and the pool entries of auxiliary variables,
+        #plus the clause database and watch lists of Glucose (constants measured on generated instances, within ~10% above a few MB)
+        vars = sum([s[1] for s in sizes])
+        clauses = sum([s[2] for s in sizes])
+        lits = sum([s[3] for s in sizes])
+        return 240*vars + 24*clauses + 8*lits
+
+    def encodeHorizon(self, maxTime):
+        #H[t] - some product still arrives to the packaging area at time t or later
+        self.H = []
+        for t in range(maxTime):
+            self.H.append(self.pool.id(('H', t)))
+
+        for t in range(maxTime):
+            for p in self.products:
+                l = self.P[p.id].get(t)
+                if l is not None:
+                    self.solver.add_clause([-l, self.H[t]])
+            if t > 0:
+                self.solver.add_clause([-self.H[t], self.H[t-1]])
+
+    def horizonAssumptions(self, timebound):
+        #Everything delivered by timebound: no time step from timebound onwards is in use
+        if timebound < len(self.H):
+            return [-self.H[timebound]]
+        return []
+
+    def encodeDeadlines(self, maxTime):
+        #D[p][t] - product p still arrives to the packaging area at time t or later
+        self.D = dict()
+        self.translate_D = dict()
+        for p in self.products:
+            self.D[p.id] = []
+            for t in range(maxTime):
+                lit = self.pool.id(('D', p.id, t))
+                self.D[p.id].append(lit)
+                self.translate_D[lit] = (p.id, t)
+
+            for t in range(maxTime):
+                l = self.P[p.id].get(t)
+                if l is not None:
+                    self.solver.add_clause([-l, self.D[p.id][t]])
+                if t > 0:
+                    self.solver.add_clause([-self.D[p.id][t], self.D[p.id][t-1]])
+
+    def deadlineAssumptions(self, timebound, prods):
+        #Every product in prods delivered by timebound
+        if timebound < len(self.D[prods[0]]):
+            return [-self.D[j][timebound] for j in prods]
+        return []
+
+    def decodeLiteral(self, lit):
+        #('X', runner, product, time), ('P', product, time) or ('A', runner, time) of a variable, None for auxiliary ones
+        if 1 <= lit <= self.numX:
+            b = int(np.searchsorted(self.xBase, lit, side = 'right')) - 1
+            return ('X', b//self.numProds + 1, b%self.numProds + 1, int(self.xLo[b] + lit - self.xBase[b]))
+        if lit <= self.numX + self.numP:
+            b = int(np.searchsorted(self.pBase, lit, side = 'right')) - 1
+            return ('P', b + 1, int(self.pLo[b] + lit - self.pBase[b]))
+        for r in self.A:
+            if lit in self.A[r]:
+                return ('A', r, lit - self.A[r][0])
+        return None
+
     def translateLiteral(self, l):
         lit = abs(l)
         if(l<0):
             print("\t-", end="")
         else:
             print("\t", end="")
-        if lit in self.translate_X:
-            i = self.translate_X[lit][0]
-            j = self.translate_X[lit][1]
-            k = self.translate_X[lit][2]
-            print("X[{}][{}][{}]".format(i, j, k))
-        elif lit in self.translate_A:
-            i = self.translate_A[lit][0]
-            k = self.translate_A[lit][1]
-            print("A[{}][{}]".format(i,k))
-        elif lit in self.translate_P:
-            j = self.translate_P[lit][0]
-            k = self.translate_P[lit][1]
-            print("P[{}][{}]".format( j, k))
-        else:
+        var = self.decodeLiteral(lit)
+        if var is None:
             print(lit)
+        else:
+            print("{}[{}]".format(var[0], "][".join([str(i) for i in var[1:]])))
             
     def printClause(self, clause):
         print("Clause: ")
         for lit in clause:
             self.translateLiteral(lit)
     
-    def printOutput(self, model, timebound):
-        print(timebound-1)
-        usedProducts = []
+    def decodePicks(self, model):
+        #Runner, product and time of every true X literal, in literal order, from a slice of the model
+        values = np.asarray(model[:self.numX])
+        lits = np.flatnonzero(values > 0) + 1
+        b = np.searchsorted(self.xBase, lits, side = 'right') - 1
+        return b//self.numProds + 1, b%self.numProds + 1, self.xLo[b] + lits - self.xBase[b]
+
+    def decodeArrivals(self, model):
+        #Product and time of every true P literal
+        values = np.asarray(model[self.numX:self.numX + self.numP])
+        lits = np.flatnonzero(values > 0) + self.numX + 1
+        b = np.searchsorted(self.pBase, lits, side = 'right') - 1
+        return b + 1, self.pLo[b] + lits - self.pBase[b]
+
+    def modelSchedule(self, model):
+        #(makespan, runner picks, order pick times) of a model
+        runnerProds = dict((r.id, []) for r in self.runners)
+        runners, prods, times = self.decodePicks(model)
+        for r, j, k in zip(runners.tolist(), prods.tolist(), times.tolist()):
+            runnerProds[r].append((j, k))
+        return self.completeSchedule(runnerProds)
 
-        runnerProds=dict().fromkeys([i for i in range(1, self.numRunners+1)])
-        for i in runnerProds:
-            runnerProds[i] = []
+    def printOutput(self, model, timebound):
+        runnerProds = dict((i, []) for i in range(1, self.numRunners+1))
 
-        orders = dict().fromkeys([i for i in range(1, self.numOrders+1)])
+        #The units of each product are queued in order of the orders, and each pick serves the next one
+        orders = dict()
+        waiting = dict((p.id, collections.deque()) for p in self.products)
         for o in self.orders:
-            orders[o.id] = dict()
-            for p in o.prods:
-                orders[o.id][p] = -1
+            orders[o.id] = dict.fromkeys(o.prods, -1)
+            for p in orders[o.id]:
+                waiting[p].append(o.id)
 
-        for v in model:
-            if abs(v) in self.translate_X:
-                if(v > 0):
-                    r = self.translate_X[v][0]
-                    j = self.translate_X[v][1]
-                    k = self.translate_X[v][2]
-                    #print("{} ".format(v), end="")
-                    #print((r, j, k))
-                    runnerProds[r].append((j, k))
-                    for o in self.orders:
-                        if (j in o.prods) and (orders[o.id][j] == -1 ):
-                            orders[o.id][j] = k
-                            break
-            else:
-                break
-        
+        runners, prods, times = self.decodePicks(model)
+        for r, j, k in zip(runners.tolist(), prods.tolist(), times.tolist()):
+            runnerProds[r].append((j, k))
+            if len(waiting[j]) > 0:
+                orders[waiting[j].popleft()][j] = k
+
+        self.printSchedule(timebound-1, runnerProds, orders)
+
+    def printSchedule(self, makespan, runnerProds, orders, file = None):
+        print(makespan, file=file)
         for r in runnerProds:
-            print("{} ".format(len(runnerProds[r])), end="")
+            print("{} ".format(len(runnerProds[r])), end="", file=file)
             runnerProds[r].sort(key = lambda x:x[1])
             for p in runnerProds[r]:
-                print("{} ".format(p[0]), end="")
-            print()
+                print("{} ".format(p[0]), end="", file=file)
+            print(file=file)
 
         for o in orders:
-            print("{} ".format(len(orders[o])), end="")
+            print("{} ".format(len(orders[o])), end="", file=file)
             for p in orders[o]:
-                 print("{}:{} ".format(p, orders[o][p]), end="")
-            print()
+                 print("{}:{} ".format(p, orders[o][p]), end="", file=file)
+            print(file=file)
+
+    def saveSchedule(self, schedule, path):
+        #Replaces path with the schedule in one step, so the file always holds a complete schedule
+        fd, tmp = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(path)), suffix = '.tmp')
+        with os.fdopen(fd, 'w') as out:
+            self.printSchedule(*schedule, file=out)
+        os.replace(tmp, path)
 
     def printModel(self, model):
         for v in model:
-            if (abs(v) in self.translate_X) and (v>0):
-                i = self.translate_X[v][0]
-                j = self.translate_X[v][1]
-                k = self.translate_X[v][2] 
-                print("Runner {} with prod {} at time {}".format(i, j, k))
-            elif (abs(v) in self.translate_P) and (v>0):
-                j = self.translate_P[v][0]
-                k = self.translate_P[v][1]
-                print("Product {} arriving at time {}".format(j, k))
-            elif (abs(v) in self.translate_A) and (v>0):
-                i = self.translate_A[v][0]
-                k = self.translate_A[v][1] 
-                print("Runner {} active at time {}".format(i,  k))
+            var = self.decodeLiteral(v) if v > 0 else None
+            if var is None:
+                continue
+            if var[0] == 'X':
+                print("Runner {} with prod {} at time {}".format(*var[1:]))
+            elif var[0] == 'P':
+                print("Product {} arriving at time {}".format(*var[1:]))
+            else:
+                print("Runner {} active at time {}".format(*var[1:]))
 
     def getMaxTimebound(self):
+        schedule = self.greedySchedule()
+        if schedule is not None:
+            self.phaseHint = schedule
+            return schedule[0] + 1
+
         time = 1
         prevProd = self.runners[0].initialPos
         for o in self.orders:
@@ -412,19 +1275,8 @@ class Problem:
         return max(min_times_total)
     
     def getSolutionTime(self, model):
-        prodTimes =[]
-        maxTime = 0
-        for v in self.translate_P:
-            var = model[v-1]
-            if (var > 0):
-                prodTimes.append(var)
-
-        for var in prodTimes:
-            t = self.translate_P[var][1]
-            if( t > maxTime):
-                maxTime = t
-
-        return maxTime
+        prods, times = self.decodeArrivals(model)
+        return int(times.max()) if len(times) > 0 else 0
     
 
 def binarySearch(possibleTimes, p):
@@ -432,64 +1284,655 @@ def binarySearch(possibleTimes, p):
         return possibleTimes[0]
 
     elif (len(possibleTimes) == 2):
+        #The upper end is always satisfiable, the lower one still has to be probed
+        p.newSolver()
+        p.encode(possibleTimes[0])
+        if(p.solver.solve()):
+            p.phaseHint = p.modelSchedule(p.solver.get_model())
+            return possibleTimes[0]
         return possibleTimes[1]
 
     else:
         midPos = len(possibleTimes)//2
         timebound = possibleTimes[midPos]
 
-        p.solver = Glucose4()
-        p.createVariables(timebound)
-        p.encodeConstraints(timebound)
+        p.newSolver()
+        p.encode(timebound)
     
         if(p.solver.solve()):
             model = p.solver.get_model()
+            p.phaseHint = p.modelSchedule(model)
             possibleTimes = [i for i in range(possibleTimes[0], timebound+1)]
             return binarySearch(possibleTimes, p)
 
         else:
             possibleTimes = [i for i in range(timebound +1, possibleTimes[len(possibleTimes)-1]+1)]
             return binarySearch(possibleTimes, p)
-        
-def linearSearch(min, max, p):
-    timebound = minTime
-    foundSol = False
-
-    for timebound in range(minTime, maxTime):
-        p.solver = Glucose4()
-        p.createVariables(timebound)
-        p.encodeConstraints(timebound)
-    
-        if(p.solver.solve()):
-            foundSol = True
-            break
-            
-    if (foundSol):
+
+def incrementalSearch(minTime, maxTime, p):
+    #Encodes the horizon once at maxTime and probes smaller timebounds through assumptions on the same solver
+    p.newSolver()
+    p.encode(maxTime, horizon = True)
+    return horizonSearch(minTime, p)
+
+def horizonSearch(minTime, p):
+    #Optimizes over an encoding that already has its horizon literals, probing timebounds through assumptions
+    if not p.solver.solve():
+        return None, None
+
+    model = p.solver.get_model()
+    upper = p.getSolutionTime(model) + 1
+    lower = minTime
+    while lower < upper:
+        timebound = (lower + upper)//2
+        if p.solver.solve(assumptions = p.horizonAssumptions(timebound)):
+            model = p.solver.get_model()
+            #Jump straight to the makespan of the model found
+            upper = p.getSolutionTime(model) + 1
+        else:
+            lower = timebound + 1
+
+    return upper, model
+
+
+def coreGuidedSearch(minTime, maxTime, p):
+    #Like incrementalSearch, but every probe assumes one deadline per product so that UNSAT probes return a core
+    p.newSolver()
+    p.encode(maxTime, deadlines = True)
+    p.criticalProducts = []
+
+    if not p.solver.solve():
+        return None, None
+
+    model = p.solver.get_model()
+    upper = p.getSolutionTime(model) + 1
+    lower = minTime
+    allProds = [j.id for j in p.products]
+    while lower < upper:
+        timebound = (lower + upper)//2
+        if p.solver.solve(assumptions = p.deadlineAssumptions(timebound, allProds)):
+            model = p.solver.get_model()
+            upper = p.getSolutionTime(model) + 1
+            continue
+
+        lower = timebound + 1
+        core = [p.translate_D[-l][0] for l in (p.solver.get_core() or [])]
+        p.criticalProducts = core
+
+        #The products in the core alone can not meet the deadline, so keep pushing their deadline
+        #with only them assumed, doubling the step while it stays UNSAT
+        step = 1
+        while len(core) > 0 and lower + step < upper:
+            timebound = lower + step
+            if p.solver.solve(assumptions = p.deadlineAssumptions(timebound, core)):
+                #Any model is still a complete schedule, but only the other products' deadlines may be missed
+                found = p.solver.get_model()
+                if p.getSolutionTime(found) + 1 < upper:
+                    model = found
+                    upper = p.getSolutionTime(found) + 1
+                break
+            lower = timebound + 1
+            core = [p.translate_D[-l][0] for l in (p.solver.get_core() or [])]
+            p.criticalProducts = core
+            step *= 2
+
+    return upper, model
+
+
+def probeWorker(p, timebound, conn):
+    #Runs in its own process: encodes and solves a single timebound, on a fresh solver that leaves the inherited one alone
+    p.solver = Glucose4()
+    p.encode(timebound)
+    if p.solver.solve():
         model = p.solver.get_model()
-        p.printOutput(model, timebound)
+        conn.send((True, model, p.getSolutionTime(model) + 1, p.modelSchedule(model)))
     else:
-        print("UNSAT")
+        conn.send((False, None, None, None))
+    p.solver.delete()
+
+def nextProbe(lower, upper, running):
+    #Timebound in the middle of the largest untested gap of [lower, upper[
+    points = [lower-1] + sorted(running) + [upper]
+    best = None
+    for a, b in zip(points, points[1:]):
+        if b - a > 1 and (best is None or b - a > best[1] - best[0]):
+            best = (a, b)
+    if best is None:
+        return None
+    return (best[0] + best[1])//2
+
+def parallelSearch(minTime, maxTime, p, numWorkers):
+    #Probes up to numWorkers timebounds at once, each worker encoding its own horizon
+    lower = minTime
+    upper = None
+    model = None
+    modelTime = None
+    running = dict()
+
+    try:
+        while True:
+            #Until a model is found, maxTime itself still has to be probed
+            hi = upper if upper is not None else maxTime + 1
+
+            #Cancel the probes that a smaller SAT or a larger UNSAT made irrelevant
+            for conn in list(running):
+                t, proc = running[conn]
+                if t < lower or t >= hi:
+                    proc.terminate()
+                    proc.join()
+                    conn.close()
+                    del running[conn]
+
+            if lower >= hi:
+                break
 
+            while len(running) < numWorkers:
+                t = nextProbe(lower, hi, [t for (t, proc) in running.values()])
+                if t is None:
+                    break
+                conn, childConn = multiprocessing.Pipe()
+                proc = multiprocessing.Process(target = probeWorker, args = (p, t, childConn))
+                proc.start()
+                running[conn] = (t, proc)
+
+            for conn in wait(list(running)):
+                t, proc = running.pop(conn)
+                try:
+                    res, m, solTime, schedule = conn.recv()
+                except EOFError:
+                    raise RuntimeError("probe worker for timebound {} died".format(t))
+                proc.join()
+                conn.close()
+
+                if res is True and (upper is None or solTime < upper):
+                    upper = solTime
+                    model = m
+                    modelTime = t
+                    #The probes started from now on prefer this schedule
+                    p.phaseHint = schedule
+                elif res is False:
+                    lower = max(lower, t + 1)
+    finally:
+        for conn in running:
+            running[conn][1].terminate()
+            running[conn][1].join()
+
+    if model is None:
+        return None, None
+
+    #The model uses the variables of the horizon it was found with
+    p.createVariables(modelTime)
+    return upper, model
+
+
+def maxsatSearch(minTime, maxTime, p):
+    #Encodes the horizon once at maxTime as hard clauses and lets RC2 minimize the number of time steps in use
+    p.solver.delete()
+    p.solver = HardClauses()
+    p.encode(maxTime, horizon = True)
+
+    #Every time step still in use from the lower bound onwards costs 1
+    for t in range(max(minTime, 1), maxTime):
+        p.solver.wcnf.append([-p.H[t]], weight = 1)
+
+    rc2 = RC2(p.solver.wcnf, solver = 'g4')
+    model = rc2.compute()
+    rc2.delete()
+
+    if model is None:
+        return None, None
+    return p.getSolutionTime(model) + 1, model
+
+
+def limitedSolve(solver, assumptions, conflicts, deadline, propagations = None):
+    #One solve under conflict (and propagation) budgets, interrupted at the deadline: True, False, or None when any of
+    #them ran out. Solvers without budgets (the portfolio) just solve
+    if not hasattr(solver, 'conf_budget'):
+        return solver.solve(assumptions = assumptions)
+    solver.conf_budget(conflicts)
+    if propagations is not None:
+        solver.prop_budget(propagations)
+    timer = None
+    if deadline is not None:
+        timer = threading.Timer(max(deadline - time.time(), 0), solver.interrupt)
+        timer.start()
+    result = solver.solve_limited(assumptions = assumptions, expect_interrupt = True)
+    if timer is not None:
+        timer.cancel()
+    solver.clear_interrupt()
+    return result
+
+def anytimeSearch(minTime, maxTime, p, budget = None, conflicts = 10000, propagations = None, gap = 0, report = None):
+    #Binary search over one encoding at maxTime like incrementalSearch, where every probe runs under conflict and
+    #propagation budgets and an exhausted probe counts as unknown. After an unknown probe, the next one is tried closer to
+    #the best schedule, and once every timebound left is unknown they are all retried with twice the budgets. Stops at
+    #the deadline, or when the best makespan is within gap (a fraction of it) of the lower bound. report(schedule) is
+    #called on every improvement. Returns the best (makespan, runner picks, order pick times) or None, the lower bound
+    #of the makespan, and whether the search ran to the end
+    deadline = time.time() + budget if budget is not None else None
+    p.newSolver()
+    p.encode(maxTime, horizon = True)
+
+    best = p.greedySchedule()
+    if best is not None and report is not None:
+        report(best)
+    #Timebounds below lower are infeasible, upper is the timebound of the best schedule (or just past maxTime)
+    lower = minTime
+    upper = best[0] + 1 if best is not None else maxTime + 1
+    unknown = set()
+    while lower < upper:
+        if deadline is not None and time.time() >= deadline:
+            break
+        if best is not None and best[0] - (lower - 1) <= gap*best[0]:
+            break
 
-if __name__ == '__main__':
-    p = Problem(sys.stdin.readlines())
+        middle = (lower + upper - 1)//2
+        untried = [t for t in range(lower, upper) if t not in unknown]
+        if len(untried) == 0:
+            unknown.clear()
+            conflicts *= 2
+            propagations = propagations*2 if propagations is not None else None
+            continue
+        timebound = next((t for t in untried if t >= middle), untried[-1])
+
+        result = limitedSolve(p.solver, p.horizonAssumptions(timebound), conflicts, deadline, propagations)
+        if result:
+            best = p.modelSchedule(p.solver.get_model())
+            upper = best[0] + 1
+            if report is not None:
+                report(best)
+        elif result is False:
+            lower = timebound + 1
+        else:
+            unknown.add(timebound)
+
+    return best, lower - 1, lower >= upper
+
+
+def lnsSearch(minTime, maxTime, p, budget = None, iterations = None, seed = 0, conflicts = 1000, tries = 3, report = None):
+    #Large neighborhood search from the greedy schedule, over one encoding at maxTime with its horizon literals. Every
+    #iteration keeps the picks of the best schedule outside a few runners or a time window, and asks the solver for a
+    #schedule that finishes earlier under a conflict budget. The neighborhood grows after a few failures, up to the whole
+    #schedule, and then starts small again with twice the budget. report(schedule) is called on every improvement.
+    #Returns the best (makespan, runner picks, order pick times) or None, and whether it is known to be optimal
+    deadline = time.time() + budget if budget is not None else None
+    rand = random.Random(seed)
+    p.newSolver()
+    p.encode(maxTime, horizon = True)
+
+    best = p.greedySchedule()
+    if best is not None and report is not None:
+        report(best)
+    failures = 0
+    iteration = 0
+    while iterations is None or iteration < iterations:
+        if deadline is not None and time.time() >= deadline:
+            break
+        if best is not None and best[0] + 1 <= minTime:
+            return best, True
+        iteration += 1
+        size = 1 + failures//tries
+        if size > p.numRunners + 1:
+            failures, size = 0, 1
+            conflicts *= 2
+
+        #1 - Free a few runners, or every pick inside a window that widens with size
+        fixed = []
+        whole = best is None or size > p.numRunners
+        if not whole:
+            runnerProds = best[1]
+            if rand.random() < 0.5 and p.numRunners > 1:
+                free = set(rand.sample(sorted(runnerProds), min(size, p.numRunners - 1)))
+                picks = [(r, j, k) for r in runnerProds if r not in free for (j, k) in runnerProds[r]]
+            else:
+                width = max(best[0]*size//(p.numRunners + 1), 1)
+                start = rand.randrange(max(best[0] - width, 0) + 1)
+                picks = [(r, j, k) for r in runnerProds for (j, k) in runnerProds[r] if not start <= k < start + width]
+            for (r, j, k) in picks:
+                l = p.X[r][j].get(k)
+                if l is not None:
+                    fixed.append(l)
+
+        #2 - Ask for a schedule delivering everything before the best makespan
+        timebound = best[0] if best is not None else maxTime
+        result = limitedSolve(p.solver, p.horizonAssumptions(timebound) + fixed, conflicts, deadline)
+        if result:
+            best = p.modelSchedule(p.solver.get_model())
+            failures = 0
+            if report is not None:
+                report(best)
+        elif result is False and whole:
+            #Nothing earlier than the best schedule exists at all
+            return best, True
+        else:
+            failures += 1
+
+    return best, False
+
+
+def branchAndBound(p, tableSize = 1000000):
+    #Depth-first branch and bound over the pick sequence of every runner, without any solver. The runner that has been
+    #busy for the shortest time always makes the next decision: a pick, or stopping for good. Returns an optimal schedule
+    #(makespan, runner picks, order pick times), or None when there is none
+    numRunners, numProds = p.numRunners, p.numProds
+    travel = [list(st) for st in p.shelvesTimes]
+    belt = [j.beltTime for j in p.products]
+    dist = p.shortestShelvesTimes()
+    minIn = [min(travel[i][j] for i in range(numProds)) for j in range(numProds)]
+    remaining = [p.productInventory[j+1] for j in range(numProds)]
+    left = sum(remaining)
+    if left < numRunners:
+        return None
+    #Every pick and every stop is one level of the search
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 2*(left + numRunners) + 100))
+
+    pos = [r.initialPos-1 for r in p.runners]
+    cur = [0]*numRunners
+    stopped = [False]*numRunners
+    routes = [[] for r in range(numRunners)]
+    blocked = [set() for r in range(numRunners)]
+    arrivals = set()
+
+    #Runners starting at the same shelf are interchangeable, so their first picks are taken in increasing product order
+    twin = [None]*numRunners
+    for r in range(numRunners):
+        for r0 in range(r):
+            if pos[r0] == pos[r]:
+                twin[r] = r0
+
+    incumbent = p.greedySchedule()
+    best = [incumbent[0] if incumbent is not None else math.inf, None]
+    #Lowest makespan so far each state was reached with, with the runners sorted so that interchangeable ones match
+    seen = dict()
+
+    def lowerBound(makespan, active):
+        #1 - Every remaining product arrives after the closest runner can reach it, in its own packaging slot
+        earliest = []
+        work = sum(cur[r] for r in active)
+        lastBelt = math.inf
+        reach = [(cur[r], dist[pos[r]]) for r in active]
+        for j in range(numProds):
+            if remaining[j] > 0:
+                e = min(c + d[j] for (c, d) in reach) + belt[j]
+                earliest.extend([e]*remaining[j])
+                work += minIn[j]*remaining[j]
+                if belt[j] < lastBelt:
+                    lastBelt = belt[j]
+        earliest.sort()
+        slot = 0
+        for e in earliest:
+            slot = slot + 1 if slot >= e else e
+            while slot in arrivals:
+                slot += 1
+        #2 - The runner that finishes last picks no earlier than the average of the remaining work
+        return max(makespan, slot, -(-work // len(active)) + lastBelt)
+
+    def search(makespan):
+        nonlocal left
+        active = [r for r in range(numRunners) if not stopped[r]]
+        if left == 0:
+            #The runners still active stop here, and none can have spent less than half the time of another
+            if min(len(route) for route in routes) > 0 and max(cur) <= 2*min(cur) and makespan < best[0]:
+                best[0] = makespan
+                best[1] = [list(route) for route in routes]
+            return
+        if len(active) == 0 or sum(1 for route in routes if len(route) == 0) > left:
+            return
+        if lowerBound(makespan, active) >= best[0]:
+            return
+
+        stops = [cur[r] for r in range(numRunners) if stopped[r]]
+        limit = 2*min(stops) if len(stops) > 0 else math.inf
+        if max(cur) > limit:
+            return
+        horizon = min(cur[r] for r in active)
+        state = (tuple(sorted((pos[r], cur[r], stopped[r], len(routes[r]) > 0, frozenset(b for b in blocked[r] if b[1] > cur[r]))
+                              for r in range(numRunners))),
+                 tuple(remaining), frozenset(a for a in arrivals if a > horizon))
+        if seen.get(state, math.inf) <= makespan:
+            return
+        if len(seen) >= tableSize:
+            seen.clear()
+        seen[state] = makespan
+
+        r = min(active, key = lambda i: (cur[i], i))
+        prev, start = pos[r], cur[r]
+        options = []
+        for j in range(numProds):
+            if remaining[j] > 0:
+                k = start + travel[prev][j]
+                a = k + belt[j]
+                if a < best[0] and k <= limit and a not in arrivals and (j, k) not in blocked[r]:
+                    if len(routes[r]) == 0 and twin[r] is not None and j <= routes[twin[r]][0][0]:
+                        continue
+                    options.append((a, k, j))
+        options.sort()
+
+        #A runner can not reach a later product at the exact time it would take to go there directly from an earlier one
+        added = [(j1, start + travel[prev][j1]) for j1 in range(numProds)]
+        added = [b for b in added if b not in blocked[r]]
+        for (a, k, j) in options:
+            blocked[r].update(added)
+            routes[r].append((j, k))
+            pos[r], cur[r] = j, k
+            remaining[j] -= 1
+            left -= 1
+            arrivals.add(a)
+            search(max(makespan, a))
+            arrivals.remove(a)
+            left += 1
+            remaining[j] += 1
+            pos[r], cur[r] = prev, start
+            routes[r].pop()
+            blocked[r].difference_update(added)
+
+        if len(routes[r]) > 0 and max(cur) <= 2*start:
+            stopped[r] = True
+            search(makespan)
+            stopped[r] = False
+
+    search(0)
+    if best[1] is None:
+        return incumbent
+    runnerProds = dict()
+    for r in p.runners:
+        runnerProds[r.id] = [(j+1, k) for (j, k) in best[1][r.id-1]]
+    return p.completeSchedule(runnerProds)
+
+
+def solveProblem(p, args):
+    #Solves one instance with the command line options and prints its schedule, returning the makespan (or None)
+    p.busyEncoding = args.busy_encoding
+    p.pruneWindows = not args.no_prune
+    p.symmetryBreaking = not args.no_symmetry
+    p.warmStart = not args.no_warm_start
+    if args.portfolio:
+        p.portfolio = args.portfolio.split(',')
+        p.portfolioLog = args.portfolio_log
+    if args.card_encoding:
+        p.setCardEncoding(args.card_encoding)
+    if args.cache_dir:
+        p.cache = EncodingCache(args.cache_dir, int(args.cache_size*2**20))
     
-    minTime = p.getMinTimebound()
+    if args.heuristic:
+        schedule = p.greedySchedule()
+        if schedule is not None:
+            p.printSchedule(*schedule)
+            return schedule[0]
+        print("UNKNOWN")
+        return None
+
+    if args.engine == 'bnb':
+        schedule = branchAndBound(p)
+        if schedule is not None:
+            p.printSchedule(*schedule)
+            return schedule[0]
+        print("UNSAT")
+        return None
+
     maxTime = p.getMaxTimebound()
+    minTime = min(p.getMinTimebound(), maxTime)
+
+    start = time.time()
+    def report(schedule):
+        #Improvements of the anytime searches
+        if args.trail:
+            p.saveSchedule(schedule, args.trail)
+        if args.stats:
+            print("makespan {} after {:.2f}s".format(schedule[0], time.time() - start), file=sys.stderr)
+
+    if args.engine == 'lns':
+        schedule, optimal = lnsSearch(minTime, maxTime, p, args.budget, args.iterations, report = report)
+        p.solver.delete()
+        if schedule is not None:
+            p.printSchedule(*schedule)
+            return schedule[0]
+        print("UNSAT" if optimal else "UNKNOWN")
+        return None
+
+    if args.engine == 'sat' and args.search == 'anytime':
+        schedule, lower, finished = anytimeSearch(minTime, maxTime, p, args.budget, args.conflicts, args.propagations, args.gap, report)
+        p.solver.delete()
+        if schedule is not None:
+            print("makespan {} lower bound {} gap {:.1%}".format(schedule[0], lower, (schedule[0] - lower)/max(schedule[0], 1)), file=sys.stderr)
+            p.printSchedule(*schedule)
+            return schedule[0]
+        print("UNSAT" if finished else "UNKNOWN")
+        return None
     
-       
-    time = binarySearch([i for i in range(minTime, maxTime+1)], p)
+    if args.engine == 'maxsat':
+        timebound, model = maxsatSearch(minTime, maxTime, p)
+    elif args.search == 'incremental':
+        timebound, model = incrementalSearch(minTime, maxTime, p)
+    elif args.search == 'parallel':
+        timebound, model = parallelSearch(minTime, maxTime, p, max(args.workers, 1))
+    elif args.search == 'core':
+        timebound, model = coreGuidedSearch(minTime, maxTime, p)
+        if args.stats and len(p.criticalProducts) > 0:
+            print("products forcing the makespan up: {}".format(" ".join([str(j) for j in p.criticalProducts])), file=sys.stderr)
+    else:
+        timebound = binarySearch([i for i in range(minTime, maxTime+1)], p)
 
-    p.solver = Glucose4()
-    p.createVariables(time)
-    p.encodeConstraints(time)
+        p.newSolver()
+        p.encode(timebound)
+        model = p.solver.get_model() if p.solver.solve() else None
 
-    if (p.solver.solve()):
-        model = p.solver.get_model()
-        p.printOutput(model, time)
+    if args.stats:
+        print("vars: {} clauses: {}".format(p.solver.nof_vars(), p.solver.nof_clauses()), file=sys.stderr)
+
+    if model is not None:
+        p.printOutput(model, timebound)
     else:
         print("UNSAT")
-   
+    p.solver.delete()
+    return timebound-1 if model is not None else None
+
+def cardEncodingSpec(spec):
+    #--card-encoding: an encoding for every call site and/or SITE=ENCODING overrides, comma separated
+    choice = dict()
+    for item in spec.split(','):
+        site, _, name = item.rpartition('=')
+        site = site or '*'
+        if site != '*' and site not in cardinalitySites:
+            raise argparse.ArgumentTypeError("unknown call site '{}' (choose from {})".format(site, ', '.join(cardinalitySites)))
+        if name != 'auto' and name not in cardEncodings:
+            raise argparse.ArgumentTypeError("unknown encoding '{}' (choose from auto, {})".format(name, ', '.join(cardEncodings)))
+        choice[site] = name
+    return choice
+
+def estimateProblem(p, args):
+    #Prints the size the encoding would have at the timebound, as JSON, without building it
+    p.busyEncoding = args.busy_encoding
+    p.pruneWindows = not args.no_prune
+    p.symmetryBreaking = not args.no_symmetry
+    if args.card_encoding:
+        p.setCardEncoding(args.card_encoding)
+    timebound = args.timebound if args.timebound is not None else p.getMaxTimebound()
+
+    sizes = p.estimateEncoding(timebound)
+    report = {
+        'timebound': timebound,
+        'families': dict((name, {'vars': vars, 'clauses': clauses, 'literals': lits}) for name, vars, clauses, lits in sizes),
+        'vars': sum([s[1] for s in sizes]),
+        'clauses': sum([s[2] for s in sizes]),
+        'literals': sum([s[3] for s in sizes]),
+        'memory_bytes': p.estimateMemory(sizes),
+    }
+    print(json.dumps(report, indent = 2))
+
+def batchInstance(path, args):
+    #Solves one instance of --batch, printing its schedule and returning its (status, makespan)
+    with open(path) as f:
+        p = Problem(readInstance(f))
+    makespan = solveProblem(p, args)
+    if makespan is not None:
+        return 'SAT', makespan
+    return ('UNKNOWN' if args.heuristic or args.engine == 'lns' or args.search == 'anytime' else 'UNSAT'), None
 
 
-    
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SAT-based solver for the WPS problem.')
+    parser.add_argument('--engine', choices=['sat', 'maxsat', 'bnb', 'lns'], default='sat',
+                        help='sat: sequence of SAT calls driven by --search; maxsat: a single RC2 optimization call; '
+                             'bnb: depth-first branch and bound in pure Python, without any solver; '
+                             'lns: large neighborhood search from the greedy schedule, stopping at --budget or --iterations')
+    parser.add_argument('--search', choices=['binary', 'incremental', 'core', 'parallel', 'anytime'], default='binary',
+                        help='binary: re-encode every timebound probe; incremental: encode once and probe with assumptions; '
+                             'core: like incremental, using UNSAT cores over per-product deadlines to lift the lower bound; '
+                             'parallel: probe several timebounds at once in worker processes; '
+                             'anytime: like incremental, with budgeted probes, stopping at --budget or --gap')
+    parser.add_argument('--budget', type=float, help='seconds allowed to --engine lns and --search anytime (no limit by default)')
+    parser.add_argument('--iterations', type=int, help='neighborhoods explored by --engine lns (no limit by default)')
+    parser.add_argument('--trail', metavar='FILE',
+                        help='file holding the best schedule of --engine lns or --search anytime, replaced on every improvement')
+    parser.add_argument('--conflicts', type=int, default=10000,
+                        help='conflicts allowed to each probe of --search anytime, doubled when every timebound left ran out')
+    parser.add_argument('--propagations', type=int, help='propagations allowed to each probe of --search anytime (no limit by default)')
+    parser.add_argument('--gap', type=float, default=0,
+                        help='--search anytime stops once the makespan is within this fraction of the lower bound, e.g. 0.05')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of parallel probes for --search parallel')
+    parser.add_argument('--busy-encoding', choices=['ternary', 'transit'], default='ternary',
+                        help='ternary: one clause per pair of picks and intermediate pick; transit: per-runner in-transit auxiliary variables')
+    parser.add_argument('--card-encoding', type=cardEncodingSpec, metavar='SPEC',
+                        help='cardinality encoding of every call site (auto, {}) and/or SITE=ENCODING overrides, comma separated; '
+                             'by default orderConstraint uses seqcounter and the other sites pairwise'.format(', '.join(cardEncodings)))
+    parser.add_argument('--no-prune', action='store_true',
+                        help='create X and P variables for every time step instead of only inside the reachability windows')
+    parser.add_argument('--no-symmetry', action='store_true',
+                        help='do not break the symmetry between runners that start at the same shelf')
+    parser.add_argument('--no-warm-start', action='store_true',
+                        help='start every probe from the default phases instead of the last schedule found')
+    parser.add_argument('--heuristic', action='store_true',
+                        help='only print the schedule found by the greedy list scheduler, without calling the solver')
+    parser.add_argument('--portfolio', metavar='BACKENDS',
+                        help='comma separated pysat solvers raced on every probe, e.g. g3,g4,cd,mcb,lgl or g4:1 for random phases with seed 1')
+    parser.add_argument('--portfolio-log', metavar='FILE', help='JSON file accumulating the wins and losses of each portfolio backend')
+    parser.add_argument('--stats', action='store_true', help='print the size of the final encoding to stderr')
+    parser.add_argument('--cache-dir', help='directory caching encoded CNFs by instance, timebound and encoding options')
+    parser.add_argument('--cache-size', type=float, default=1024, help='size limit of --cache-dir in MB, least recently used entries are removed first')
+    parser.add_argument('--dry-run', '--estimate', action='store_true',
+                        help='print the number of variables, clauses and literals of each constraint family and the estimated memory, without encoding')
+    parser.add_argument('--timebound', type=int, help='timebound estimated by --dry-run (defaults to the upper bound of the search)')
+    parser.add_argument('--batch', nargs='+', metavar='PATH',
+                        help='solve every .wps file in these directories or globs instead of reading stdin')
+    parser.add_argument('--out-dir', help='directory receiving one .out file per instance and summary.jsonl, for --batch')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='number of instances solved at once, for --batch')
+    parser.add_argument('--timeout', type=float, help='wall-clock limit in seconds for each instance, for --batch')
+    args = parser.parse_args()
+    if args.batch and not args.out_dir:
+        parser.error('--batch needs --out-dir')
+    if args.search == 'parallel' and args.portfolio:
+        parser.error('--search parallel already runs its probes in separate processes, it can not be combined with --portfolio')
+
+    if args.batch:
+        batchSolve(args.batch, args.out_dir, functools.partial(batchInstance, args = args), args.jobs, args.timeout)
+    else:
+        try:
+            instance = readInstance(sys.stdin)
+        except IncorrectFormat as e:
+            sys.exit('Incorrect instance: {}'.format(e))
+        if args.dry_run:
+            estimateProblem(Problem(instance), args)
+        else:
+            solveProblem(Problem(instance), args)
+
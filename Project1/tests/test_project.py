@@ -0,0 +1,68 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+pytest.importorskip('pysat')
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+CHECKER = os.path.join(ROOT, os.pardir, 'wps-checker')
+
+
+def solve(instance, *options):
+    #Output of the tool on one of the bundled instances
+    with open(os.path.join(ROOT, 'instances_p1_small', instance + '.wps')) as f:
+        return subprocess.run([sys.executable, os.path.join(ROOT, 'src', 'project.py')] + list(options),
+                              stdin=f, capture_output=True, text=True, check=True).stdout
+
+
+def makespan(instance, *options):
+    #First line printed by the tool on one of the bundled instances
+    return solve(instance, *options).split('\n')[0]
+
+
+def optimum(instance):
+    with open(os.path.join(ROOT, 'instances_p1_small', instance + '.out')) as f:
+        return f.readline().strip()
+
+
+@pytest.mark.parametrize('instance', ['enunciado1', 't_2_3_10_3_2'])
+def test_binary_search_finds_optimum(instance):
+    #The greedy upper bound is tight, so the lower end of the last two timebounds must still be probed
+    assert makespan(instance) == optimum(instance)
+
+
+@pytest.mark.parametrize('instance', ['enunciado1', 'enunciado2', 't_2_3_10_3_2', 't_2_3_5_5_4'])
+def test_branch_and_bound_matches_sat(instance):
+    assert makespan(instance, '--engine', 'bnb') == makespan(instance)
+
+
+@pytest.mark.parametrize('search', ['binary', 'incremental'])
+def test_cached_encoding_gives_same_makespan(search, tmp_path):
+    #The first run misses and stores its encodings, the second one loads them instead of encoding
+    options = ['--search', search, '--cache-dir', str(tmp_path)]
+    miss = makespan('t_2_3_10_3_2', *options)
+    entries = sorted(os.listdir(str(tmp_path)))
+    assert len(entries) > 0
+    assert makespan('t_2_3_10_3_2', *options) == miss == optimum('t_2_3_10_3_2')
+    assert sorted(os.listdir(str(tmp_path))) == entries
+
+
+@pytest.mark.parametrize('options', [['--no-symmetry'], ['--no-prune'], ['--busy-encoding', 'transit']])
+@pytest.mark.parametrize('instance', ['enunciado1', 't_2_3_10_3_2', 't_2_3_5_5_4'])
+def test_encoding_options_keep_optimum(instance, options):
+    #Symmetry breaking, the pruned time windows and the busy encoding must not change the optimum
+    assert makespan(instance, *options) == optimum(instance)
+
+
+@pytest.mark.parametrize('instance', ['enunciado1', 't_2_3_10_3_2', 't_2_3_5_5_4'])
+def test_lns_schedule_passes_checker(instance, tmp_path):
+    if not os.access(CHECKER, os.X_OK):
+        pytest.skip('wps-checker is not available')
+    out = tmp_path / (instance + '.out')
+    out.write_text(solve(instance, '--engine', 'lns', '--iterations', '50'))
+    #The checker exits with 0 either way, only its output tells a valid schedule
+    res = subprocess.run([CHECKER, os.path.join(ROOT, 'instances_p1_small', instance + '.wps'), str(out)],
+                         capture_output=True, text=True)
+    assert res.stdout.strip() == 'OK'
@@ -1,115 +1,110 @@
 import sys
-import math
+import os
+import time
+import argparse
+import functools
 import z3
 
-
-class Product:
-    def __init__(self, id, beltTime):
-        self.id = id
-        self.beltTime = beltTime
-
-class Order:
-    def __init__(self, id, numProds, prods):
-        self.id = id
-        self.numProds = numProds
-        self.prods = prods
-
-class Runner:
-    def __init__(self, id, initialPos):
-        self.id = id
-        self.initialPos = initialPos
-
-class Problem:
-    def __init__(self, lines):
-        parseCounter = 0
-        # Line 1 - Number of Runners
-        self.numRunners = int(lines[parseCounter].rstrip())
-        parseCounter += 1
-
-        # Line 2 - Number of Products
-        self.numProds = int(lines[parseCounter].rstrip())
-        parseCounter += 1
-
-        # Line 3 - Runners Initial Positions
-        rPos = lines[parseCounter].rstrip().split()
-        self.runners = [Runner(i+1, int(rPos[i])) for i in range(self.numRunners)]
-        
-        parseCounter += 1
-
-        # Line 4 - __ Time between Products Shelves
-        self.shelvesTimes = []
-        l = parseCounter
-        for i in range(l, l + self.numProds):
-            line = [int(j) for j in lines[i].rstrip().split()]
-            self.shelvesTimes.append(line)
-            parseCounter += 1
-            
-        # Time in Conveyer Belt for Each Product
-        self.products = []
-        line = lines[parseCounter].rstrip().split()
-        parseCounter += 1
-        for i in range(self.numProds):
-            self.products.append(Product(i+1, int(line[i])))
-        
-        # Number of Orders
-        self.numOrders = int(lines[parseCounter].rstrip())
-        parseCounter +=1
-
-        # Each Order in format: #NumProductsInOrder 1 .. N Products IDs
-        self.orders = []
-        self.productInventory = dict.fromkeys([i+1 for i in range(self.numProds)], 0)
-        oid = 1
-        for i in range(parseCounter, parseCounter + self.numOrders):
-            line = lines[i].rstrip().split()
-            nProd = int(line[0])
-            prods = [int(j) for j in line[1:]]
-            for p in prods:
-                self.productInventory[p] += 1
-            self.orders.append(Order(oid, nProd, prods))
-            oid +=1
+#The instance parser is shared with the other tools at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from wpsinstance import readInstance, IncorrectFormat
+from wpsbatch import batchSolve
+from wpsgreedy import ListScheduler
+
+
+class Problem(ListScheduler):
+    def __init__(self, instance):
+        #instance - a wpsinstance.Instance, see readInstance
+        self.numRunners = instance.numRunners
+        self.numProds = instance.numProds
+        self.numOrders = instance.numOrders
+        self.runners = instance.runners()
+        self.products = instance.products()
+        self.orders = instance.orders()
+        self.shelvesTimes = instance.shelvesTimes
+        self.productInventory = dict((j+1, instance.inventory[j]) for j in range(self.numProds))
 
         # ------------------ #
         # Encoding Variables #
         # -------------------#
+        #Pairwise formulation, see createVariables
+        self.deliveries = []
         self.X = dict()
 
         self.P = dict()
 
         self.A = dict()
 
+        #Successor formulation only, see createSuccessorVariables
+        self.items = []
+        self.S = dict()
+        self.F = dict()
+        self.R = dict()
+        self.K = dict()
+
         self.solver = z3.Optimize()
         self.clauses = []
 
+        self.greedyRestarts = 100
+        #pairwise - pick times per runner, ordered with explicit pairs and triples of picks
+        #successor - one route of items per runner, quadratic in the number of ordered items
+        self.formulation = 'pairwise'
+        #int - unbounded integers, bv - signed bit-vectors just wide enough for every term of the encoding
+        self.theory = 'bv'
+        self.width = None
+
+    def intVar(self, name):
+        if self.theory == 'bv':
+            return z3.BitVec(name, self.width)
+        return z3.Int(name)
+
+    def encode(self, minT, maxT):
+        #Creates the variables and adds the constraints of the chosen formulation to the current solver
+        #The largest term is a time below maxT plus a travel or belt time, or an item number of the successor formulation.
+        #With the sign bit on top nothing overflows, so signed comparisons and division behave as on integers
+        maxShelfTime = max([max(st) for st in self.shelvesTimes])
+        maxBeltTime = max([j.beltTime for j in self.products])
+        numItems = sum([o.numProds for o in self.orders])
+        self.width = max(maxT + maxShelfTime + maxBeltTime, numItems + self.numRunners).bit_length() + 1
+
+        if self.formulation == 'successor':
+            self.createSuccessorVariables(minT, maxT)
+            self.encodeSuccessorConstraints()
+        else:
+            self.createVariables(minT, maxT)
+            self.encodeConstraints()
+
     def createVariables(self, minT, maxT):
+        #The units of a product are interchangeable, so instead of one variable per (order, product) the pairwise
+        #formulation has one per delivery of each product: X[r][j][u] and P[j][u] for the u-th unit of product j, whose
+        #arrivals are ordered. printOutput gives the u-th unit to the u-th order asking for j
         self.X = dict()
         self.P = dict()
         self.A = dict()
 
-        self.time = z3.Int("T")
+        self.time = self.intVar("T")
         self.solver.add(self.time > minT)
         self.solver.add(self.time < maxT)
 
+        self.deliveries = [(j.id, u) for j in self.products for u in range(1, self.productInventory[j.id]+1)]
+
         for i in range(1, self.numRunners+1):
             self.X[i] = dict()
-            for o in self.orders:
-                self.X[i][o.id] = dict()
-                for p in o.prods:
-                    self.X[i][o.id][p] = z3.Int("X_%s_%s_%s" %(i, o.id, p))
-                    x = self.X[i][o.id][p]
-                    self.solver.add([x<self.time])
-                    self.solver.add([x>=0])
-
-
-        for o in self.orders:
-            self.P[o.id] = dict()
-            for p in o.prods:
-                self.P[o.id][p] = z3.Int("P_%s_%s" %(o.id, p))
-                x = self.P[o.id][p]
-                self.solver.add(1 < x) #All products must arrive
-                self.solver.add(x<self.time)
+            for (j, u) in self.deliveries:
+                x = self.X[i].setdefault(j, dict())[u] = self.intVar("X_%s_%s_%s" %(i, j, u))
+                self.solver.add([x<self.time])
+                self.solver.add([x>=0])
+
+        for (j, u) in self.deliveries:
+            x = self.P.setdefault(j, dict())[u] = self.intVar("P_%s_%s" %(j, u))
+            self.solver.add(1 < x) #All products must arrive
+            self.solver.add(x<self.time)
+            if u > 1:
+                #Units arrive in order, which also takes the place of breakProductSym
+                self.solver.add(self.P[j][u-1] < x)
 
         for r in range(1, self.numRunners+1):
-            self.A[r] = z3.Int("A_%s" %(r))
+            self.A[r] = self.intVar("A_%s" %(r))
             x = self.A[r]
             self.solver.add(0 < x) #All runners start active at time 0
             self.solver.add(x<self.time)
@@ -123,130 +118,120 @@ class Problem:
 
     def runnerActiveConstraint(self):
         for r in self.runners:
-            for o in self.X[r.id]:
-                for j in self.X[r.id][o]:
-                    x = self.X[r.id][o][j]
-                    a = self.A[r.id]
-                    self.solver.add([x < a])
+            for (j, u) in self.deliveries:
+                x = self.X[r.id][j][u]
+                a = self.A[r.id]
+                self.solver.add([x < a])
 
     def runnerInitialPosition(self):
         for r in self.runners:
             j = r.initialPos
             cls = []
-            for o in self.X[r.id]:
-                for j1 in self.X[r.id][o]:
-                    x1 = self.X[r.id][o][j1]
-                    t = self.shelvesTimes[j-1][j1-1]
-                    cls.append((x1 == t))
+            for (j1, u1) in self.deliveries:
+                x1 = self.X[r.id][j1][u1]
+                t = self.shelvesTimes[j-1][j1-1]
+                cls.append((x1 == t))
             a = self.A[r.id]
             cls.append((a == 1))
             self.solver.add(z3.AtMost(*cls, 1))
             self.solver.add(z3.AtLeast(*cls, 1))
 
-            for o1 in self.orders:
-                for j1 in o1.prods:
-                    x1 = self.X[r.id][o1.id][j1]
-                    t = self.shelvesTimes[j-1][j1-1]
-                    for o2 in self.orders:
-                        for j2 in o2.prods:
-                            x2 = self.X[r.id][o2.id][j2]
-                            if (o2.id != o1.id or j2 != j1):
-                                self.solver.add(
-                                    z3.Implies(
-                                        z3.And(x1 == t),
-                                        z3.Or(x2 > x1 , x2 ==0)
-                                    )
-                                )
-                                #X2 cant be in time interval [X1,X]
+            for (j1, u1) in self.deliveries:
+                x1 = self.X[r.id][j1][u1]
+                t = self.shelvesTimes[j-1][j1-1]
+                for (j2, u2) in self.deliveries:
+                    x2 = self.X[r.id][j2][u2]
+                    #Later units of the first product are picked later anyway
+                    if (j2 != j1 or u2 < u1):
+                        self.solver.add(
+                            z3.Implies(
+                                z3.And(x1 == t),
+                                z3.Or(x2 > x1 , x2 ==0)
+                            )
+                        )
+                        #X2 cant be in time interval [X1,X]
         
     def packagingAreaConstraint(self):
-        for o in self.P:
-            for j in self.P[o]:
-                for o1 in self.P:
-                    for j1  in self.P[o1]:
-                        if(o!=o1 or j!=j1):
-                            p = self.P[o][j]
-                            p1 = self.P[o1][j1]
-                            self.solver.add([p != p1 ])
+        #Units of the same product already arrive in order
+        for (j, u) in self.deliveries:
+            for (j1, u1) in self.deliveries:
+                if(j < j1):
+                    p = self.P[j][u]
+                    p1 = self.P[j1][u1]
+                    self.solver.add([p != p1 ])
            
     def conveyorBeltConstraint(self):
         for r in self.runners:
-            for o in self.orders:
-                for j in self.products:
-                    if(j.id in o.prods):
-                        x = self.X[r.id][o.id][j.id]
-                        p = self.P[o.id][j.id]
-                        self.solver.add( 
-                            z3.Implies(
-                                x!=0,
-                                p == x + j.beltTime))
+            for (j, u) in self.deliveries:
+                x = self.X[r.id][j][u]
+                p = self.P[j][u]
+                self.solver.add( 
+                    z3.Implies(
+                        x!=0,
+                        p == x + self.products[j-1].beltTime))
 
     def runnerOneProductAtATime(self):
+        #Two units of the same product picked by one runner arrive, and so are picked, at different times
         for r in self.runners:
-           for o in self.X[r.id]:
-            for j in self.X[r.id][o]:
-                for o1 in self.X[r.id]:
-                    for j1  in self.X[r.id][o1]:
-                        if(o!=o1 or j!=j1):
-                            p = self.X[r.id][o][j]
-                            p1 = self.X[r.id][o1][j1]
-                            self.solver.add(
-                                z3.Implies(
-                                    z3.Or(p!=0, p1!=0),
-                                    p != p1))
+            for (j, u) in self.deliveries:
+                for (j1, u1) in self.deliveries:
+                    if(j != j1):
+                        p = self.X[r.id][j][u]
+                        p1 = self.X[r.id][j1][u1]
+                        self.solver.add(
+                            z3.Implies(
+                                z3.Or(p!=0, p1!=0),
+                                p != p1))
 
     def runnerIsBusyConstraint(self):
+        #An earlier unit of the product picked first, or a later unit of the product picked second, is already outside
+        #the interval thanks to the order of arrivals, and a unit is never picked right after a later unit of its product
         for r in self.runners:
-            for o in self.orders:
-                for j in o.prods:
-                    x = self.X[r.id][o.id][j]
-                    for o1 in self.orders:
-                        for j1 in o1.prods:
-                            if (o1.id != o.id or j != j1):
-                                 x1 = self.X[r.id][o1.id][j1]
-                                 t = self.shelvesTimes[j-1][j1-1]
-                                 for o2 in self.orders:
-                                     for j2 in o2.prods:
-                                         x2 = self.X[r.id][o2.id][j2]
-                                         if ((o2.id != o1.id or j2 != j1) and (j2 != j or o2.id != o.id)):
-                                             self.solver.add(
-                                                 z3.Implies(
-                                                     z3.And(x == x1 + t, x1 != 0, x != 0),
-                                                     z3.Or(x2 > x , x2 < x1)
-                                                 )
-                                             )
-                                             #X2 cant be in time interval [X1,X] 
+            for (j, u) in self.deliveries:
+                x = self.X[r.id][j][u]
+                for (j1, u1) in self.deliveries:
+                    if (j1 != j or u1 < u):
+                        x1 = self.X[r.id][j1][u1]
+                        t = self.shelvesTimes[j-1][j1-1]
+                        for (j2, u2) in self.deliveries:
+                            if (j2 == j1 and u2 <= u1) or (j2 == j and u2 >= u):
+                                continue
+                            x2 = self.X[r.id][j2][u2]
+                            self.solver.add(
+                                z3.Implies(
+                                    z3.And(x == x1 + t, x1 != 0, x != 0),
+                                    z3.Or(x2 > x , x2 < x1)
+                                )
+                            )
+                            #X2 cant be in time interval [X1,X] 
 
     def productTransitionsConstraint(self):
+        #An earlier unit of the same product can never be the next pick
         for r in self.runners:
-            for o in self.X[r.id]:
-                for j in self.X[r.id][o]:
-                    x = self.X[r.id][o][j]
-                    cls = []
-                    for o1 in self.X[r.id]:
-                        for j1 in self.X[r.id][o1]:
-                            if(o!= o1  or j!=j1):
-                                x1 = self.X[r.id][o1][j1]
-                                t = self.shelvesTimes[j-1][j1-1]
-                                cls.append((x1 == x + t))
-                    #cls.append((x==0))
-                    a = self.A[r.id]
-                    cls.append((a == x + 1))
-                    self.solver.add(z3.Implies(x!=0, 
-                                        z3.AtMost(*cls, 1))) 
-
-                    self.solver.add(z3.Implies(x!=0, 
-                                    z3.AtLeast(*cls, 1)))
+            for (j, u) in self.deliveries:
+                x = self.X[r.id][j][u]
+                cls = []
+                for (j1, u1) in self.deliveries:
+                    if(j1 != j or u1 > u):
+                        x1 = self.X[r.id][j1][u1]
+                        t = self.shelvesTimes[j-1][j1-1]
+                        cls.append((x1 == x + t))
+                a = self.A[r.id]
+                cls.append((a == x + 1))
+                self.solver.add(z3.Implies(x!=0, 
+                                    z3.AtMost(*cls, 1))) 
+
+                self.solver.add(z3.Implies(x!=0, 
+                                z3.AtLeast(*cls, 1)))
               
     def productDeliveredByOneRunner(self):
-        for o in self.orders:
-            for j in o.prods:
-                cls = []
-                for r in self.runners:
-                    x = self.X[r.id][o.id][j]
-                    cls.append(x!=0)
-                self.solver.add(z3.AtMost(*cls, 1)) 
-                self.solver.add(z3.AtLeast(*cls, 1))
+        for (j, u) in self.deliveries:
+            cls = []
+            for r in self.runners:
+                x = self.X[r.id][j][u]
+                cls.append(x!=0)
+            self.solver.add(z3.AtMost(*cls, 1)) 
+            self.solver.add(z3.AtLeast(*cls, 1))
         
     def breakProductSym(self):
         prodSequence = dict()
@@ -302,74 +287,209 @@ class Problem:
         #9 - A product takes c_j time from the conveyor belt to the packaging area 
         self.conveyorBeltConstraint()
 
-        #10 - Each product j in order o is delivered by exactly one runner TODO 
+        #10 - Each unit of product j is delivered by exactly one runner
         self.productDeliveredByOneRunner()
 
+        #11 - Breaking Product Symmetries: the units of every product arrive in order, see createVariables
+
+        #12 - Breaking Runner Symmetries
+        self.breakRunnerSym()
+
+    def createSuccessorVariables(self, minT, maxT):
+        #items[i-1] - the (order, product) of item i
+        #K[i] - time item i is picked, R[i] - runner that picks it
+        #S[i] - item picked next by the same runner, or numItems+r if i is the last item of runner r
+        #F[r] - first item picked by runner r, or numItems+r if r picks nothing
+        self.X = dict()
+        self.P = dict()
+        self.A = dict()
+
+        self.time = self.intVar("T")
+        self.solver.add(self.time > minT)
+        self.solver.add(self.time < maxT)
+
+        self.items = [(o.id, j) for o in self.orders for j in o.prods]
+        n = len(self.items)
+        self.S = dict()
+        self.R = dict()
+        self.K = dict()
+        for i in range(1, n+1):
+            o, j = self.items[i-1]
+            self.S[i] = self.intVar("S_%s" %(i))
+            self.R[i] = self.intVar("R_%s" %(i))
+            self.K[i] = self.intVar("K_%s" %(i))
+            self.solver.add(self.S[i] >= 1, self.S[i] <= n + self.numRunners, self.S[i] != i)
+            self.solver.add(self.R[i] >= 1, self.R[i] <= self.numRunners)
+
+            self.P.setdefault(o, dict())[j] = self.intVar("P_%s_%s" %(o, j))
+            x = self.P[o][j]
+            self.solver.add(x == self.K[i] + self.products[j-1].beltTime)
+            self.solver.add(1 < x) #All products must arrive
+            self.solver.add(x < self.time)
+
+        self.F = dict()
+        for r in range(1, self.numRunners+1):
+            self.F[r] = self.intVar("F_%s" %(r))
+            self.solver.add(z3.Or(z3.And(self.F[r] >= 1, self.F[r] <= n), self.F[r] == n + r))
+
+            self.A[r] = self.intVar("A_%s" %(r))
+            x = self.A[r]
+            self.solver.add(0 < x) #All runners start active at time 0
+            self.solver.add(x < self.time)
+
+    def encodeSuccessorConstraints(self):
+        #The routes need no explicit pairs of picks: consecutive items are exactly one travel time apart, so a runner never
+        #picks two items at once or anything while travelling, and times strictly increase along a route, so it has no cycles
+        n = len(self.items)
+
+        #1 - A runner cannot spend less than 50% of the max timespan amongst other runners
+        self.runnerPercentages()
+
+        #Every item comes right after exactly one runner start or item, and every runner's route ends once
+        self.solver.add(z3.Distinct(*(list(self.F.values()) + list(self.S.values()))))
+
+        #2 - Runners start at their initial position, and one that picks nothing is only active at time 0
+        for r in self.runners:
+            for k in range(1, n+1):
+                t = self.shelvesTimes[r.initialPos-1][self.items[k-1][1]-1]
+                if t == 0:
+                    self.solver.add(self.F[r.id] != k)
+                else:
+                    self.solver.add(z3.Implies(self.F[r.id] == k, z3.And(self.R[k] == r.id, self.K[k] == t)))
+            self.solver.add(z3.Implies(self.F[r.id] == n + r.id, self.A[r.id] == 1))
+
+        #5 - A runner takes t_ij time from product i to product j, and stops being active after its last item
+        for i in range(1, n+1):
+            j = self.items[i-1][1]
+            for k in range(1, n+1):
+                if k == i:
+                    continue
+                t = self.shelvesTimes[j-1][self.items[k-1][1]-1]
+                if t == 0:
+                    self.solver.add(self.S[i] != k)
+                else:
+                    self.solver.add(z3.Implies(self.S[i] == k, z3.And(self.R[k] == self.R[i], self.K[k] == self.K[i] + t)))
+            for r in self.runners:
+                self.solver.add(z3.Implies(self.S[i] == n + r.id, z3.And(self.R[i] == r.id, self.A[r.id] == self.K[i] + 1)))
+
+        #4 - Only one product arriving to the packaging area at a time
+        arrivals = [x for o in self.P for x in self.P[o].values()]
+        if len(arrivals) > 1:
+            self.solver.add(z3.Distinct(*arrivals))
+
         #11 - Breaking Product Symmetries
         self.breakProductSym()
 
         #12 - Breaking Runner Symmetries
         self.breakRunnerSym()
 
-        # We want the minimum possible time...
-        self.solver.minimize(self.time)
-                
-    def printOutput(self, model):
-        time = 0
-        x = dict()
-        p = dict()
-        a = dict()
+    def successorValues(self, schedule):
+        #Values of the successor variables for a schedule (makespan, runner picks, order pick times), as (variable, value)
+        makespan, runnerProds, orders = schedule
+        n = len(self.items)
+        runnerOf = dict()
+        for r in runnerProds:
+            for (j, k) in runnerProds[r]:
+                runnerOf[(j, k)] = r
+
+        itemAt = dict()
+        values = [(self.time, makespan + 1)]
+        for i in range(1, n+1):
+            o, j = self.items[i-1]
+            k = orders[o][j]
+            itemAt[(runnerOf[(j, k)], k)] = i
+            values += [(self.K[i], k), (self.R[i], runnerOf[(j, k)]), (self.P[o][j], k + self.products[j-1].beltTime)]
 
         for r in self.runners:
-            x[r.id] = dict()
+            route = [itemAt[(r.id, k)] for (j, k) in sorted(runnerProds[r.id], key = lambda pick: pick[1])] + [n + r.id]
+            values.append((self.F[r.id], route[0]))
+            for i, nxt in zip(route, route[1:]):
+                values.append((self.S[i], nxt))
+            values.append((self.A[r.id], max([k for (j, k) in runnerProds[r.id]]) + 1 if len(route) > 1 else 1))
+        return values
+
+    def startFromGreedy(self):
+        #Initial values of the solver from the greedy schedule the upper bound came from (successor formulation only)
+        schedule = self.greedySchedule() if self.formulation == 'successor' else None
+        if schedule is not None:
+            for x, value in self.successorValues(schedule):
+                self.solver.set_initial_value(x, value)
+
+    def variables(self):
+        #Every variable of the encoding, T first
+        return [self.time] + [x for r in self.X for o in self.X[r] for x in self.X[r][o].values()] + \
+               [x for o in self.P for x in self.P[o].values()] + list(self.A.values()) + \
+               list(self.S.values()) + list(self.F.values()) + list(self.R.values()) + list(self.K.values())
+
+    def getSolutionTime(self, model):
+        #Makespan of a model: the last arrival to the packaging area (T itself can be any larger value)
+        return max([model.eval(x).as_long() for o in self.P for x in self.P[o].values()])
+
+
+    def printSuccessorOutput(self, model):
+        runnerProds = dict()
+        for r in self.runners:
+            runnerProds[r.id] = []
+        orders = dict()
+        for o in self.orders:
+            orders[o.id] = dict()
+
+        for i in range(1, len(self.items)+1):
+            o, j = self.items[i-1]
+            k = model.eval(self.K[i]).as_long()
+            runnerProds[model.eval(self.R[i]).as_long()].append((j, k))
+            orders[o][j] = k
+
+        self.printSchedule(self.getSolutionTime(model), runnerProds, orders)
+
+    def printOutput(self, model):
+        if self.formulation == 'successor':
+            self.printSuccessorOutput(model)
+            return
 
+        runnerProds = dict()
+        units = dict()
+        for r in self.runners:
+            runnerProds[r.id] = []
+            for (j, u) in self.deliveries:
+                k = model.eval(self.X[r.id][j][u], model_completion = True).as_long()
+                if k != 0:
+                    runnerProds[r.id].append((j, k))
+                    units[(j, u)] = k
+
+        #The orders asking for a product get its units in order
+        orders = dict()
+        served = dict((j.id, 0) for j in self.products)
         for o in self.orders:
-            p[o.id] = dict()
-        
-        for m in model.decls():
-            if (m.name()[0] == "X"):
-                var = m.name().split("_")
-                runner = int(var[1])
-                order = int(var[2])
-                prod = int(var[3])
-                if (model[m].as_long() != 0):
-                    p[order][prod] = model[m].as_long()
-                    #p[order] = {k: v for k,v in sorted(p[order].items(), key = lambda item:item[1])}
-                x[runner][(order, prod)] = model[m].as_long()
-                x[runner] = {k: v for k,v in sorted(x[runner].items(), key = lambda item:item[1])}
-
-            elif (m.name()[0] == "T"):
-                time = model[m].as_long() -1
-
-            '''    
-            elif (m.name()[0] == "P"):
-                order = int(m.name()[2])
-                prod = int(m.name()[4])
-                p[order][prod] = model[m].as_long()
-
-            elif (m.name()[0] == "A"):
-                var
-                runner = int(m.name()[2])
-                a[runner] = model[m].as_long()'''
+            orders[o.id] = dict()
+            for j in o.prods:
+                served[j] += 1
+                orders[o.id][j] = units[(j, served[j])]
+
+        self.printSchedule(self.getSolutionTime(model), runnerProds, orders)
+
+    def printSchedule(self, time, runnerProds, orders):
         print(time)
-        for runner in x:
+        for runner in runnerProds:
             output = ""
-            n_prods_runner = 0
-            for i in x[runner]:
-                if x[runner][i] != 0:
-                    n_prods_runner+=1
-                    output += " " + str(i[1])
-            print(str(n_prods_runner) + output)
+            for i in sorted(runnerProds[runner], key = lambda item:item[1]):
+                output += " " + str(i[0])
+            print(str(len(runnerProds[runner])) + output)
 
         for o in self.orders:
             output = ""
-            prod_len = len(p[o.id])
-            for prod in p[o.id]:
-                output+= " " + str(prod) + ":" + str(p[o.id][prod])
+            prod_len = len(orders[o.id])
+            for prod in orders[o.id]:
+                output+= " " + str(prod) + ":" + str(orders[o.id][prod])
 
             print(str(prod_len) + output)
 
     def getMaxTimebound(self):
+        schedule = self.greedySchedule()
+        if schedule is not None:
+            #T must be strictly smaller than the bound
+            return schedule[0] + 2
+
         time = 1
         prevProd = self.runners[0].initialPos
         for o in self.orders:
@@ -410,19 +530,120 @@ class Problem:
 
         return max(min_times_total)
     
-if __name__ == '__main__':
-    p = Problem(sys.stdin.readlines())
-    
-    minTime = p.getMinTimebound()
-    maxTime = p.getMaxTimebound()
-       
+def optimizeSearch(minTime, maxTime, p):
+    #Minimizes T with z3.Optimize, returning an optimal model (or None)
     p.solver = z3.Optimize()
-    p.createVariables(minTime, maxTime)
-    p.encodeConstraints()
-    
-    if(p.solver.check() == z3.sat):
-        model = p.solver.model()
+    p.encode(minTime, maxTime)
+    p.solver.minimize(p.time)
+    if p.solver.check() == z3.sat:
+        return p.solver.model()
+    return None
+
+def incrementalSearch(minTime, maxTime, p, budget = None):
+    #Asserts the constraints once in a plain SMT solver, then tightens T with tighteningSearch. z3.Solver() would combine
+    #it with an incremental SAT solver that rejects set_initial_value
+    p.solver = z3.SimpleSolver()
+    p.encode(minTime, maxTime)
+    p.startFromGreedy()
+    return tighteningSearch(p, budget)
+
+def tighteningSearch(p, budget = None):
+    #Keeps asking the solver for a schedule that finishes earlier than the last one, starting from its values. Returns
+    #(model, optimal); when the budget (in seconds) runs out, model is the best schedule found so far
+    deadline = time.time() + budget if budget is not None else None
+    best = None
+    while True:
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return best, False
+            p.solver.set('timeout', max(1, int(remaining*1000)))
+
+        result = p.solver.check()
+        if result == z3.unsat:
+            return best, True
+        if result != z3.sat:
+            return best, False
+
+        best = p.solver.model()
+        #The bound only ever gets tighter, so it is asserted for good instead of under push/pop, keeping every lemma learned so far
+        p.solver.add(p.time <= p.getSolutionTime(best))
+        for x in p.variables():
+            p.solver.set_initial_value(x, best.eval(x, model_completion = True))
+
+def solveProblem(p, args):
+    #Solves one instance and prints its schedule, returning the makespan (or None)
+    if args.heuristic:
+        schedule = p.greedySchedule()
+        if schedule is not None:
+            p.printSchedule(*schedule)
+            return schedule[0]
+        print("UNKNOWN")
+        return None
+
+    p.formulation = args.formulation
+    p.theory = args.theory
+    maxTime = p.getMaxTimebound()
+    minTime = min(p.getMinTimebound(), maxTime-2)
+
+    if args.search == 'incremental':
+        model, optimal = incrementalSearch(minTime, maxTime, p, args.budget)
+        if not optimal:
+            print("time budget exhausted, the schedule is not proven optimal", file=sys.stderr)
+            if model is None:
+                #Nothing better than the greedy schedule the upper bound came from
+                schedule = p.greedySchedule()
+                if schedule is not None:
+                    p.printSchedule(*schedule)
+                    return schedule[0]
+                print("UNKNOWN")
+                return None
+    else:
+        model = optimizeSearch(minTime, maxTime, p)
+
+    if model is not None:
         p.printOutput(model)
+        return p.getSolutionTime(model)
+    print("UNSAT")
+    return None
+
+def batchInstance(path, args):
+    #Solves one instance of --batch, printing its schedule and returning its (status, makespan)
+    with open(path) as f:
+        p = Problem(readInstance(f))
+    makespan = solveProblem(p, args)
+    if makespan is not None:
+        return 'SAT', makespan
+    #Only a search that ran to the end proves there is no schedule
+    budgeted = args.search == 'incremental' and args.budget is not None
+    return ('UNKNOWN' if args.heuristic or budgeted else 'UNSAT'), None
 
-    else: 
-        print("UNSAT")
\ No newline at end of file
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SMT-based solver for the WPS problem.')
+    parser.add_argument('--heuristic', action='store_true',
+                        help='only print the schedule found by the greedy list scheduler, without calling the solver')
+    parser.add_argument('--search', choices=['optimize', 'incremental'], default='optimize',
+                        help='minimize T with z3.Optimize, or tighten it one schedule at a time with an incremental z3.Solver')
+    parser.add_argument('--formulation', choices=['pairwise', 'successor'], default='pairwise',
+                        help='pick times ordered by explicit pairs and triples of picks, or one route of successive items per runner')
+    parser.add_argument('--theory', choices=['int', 'bv'], default='bv',
+                        help='encode times as unbounded integers or as bit-vectors sized from the upper bound')
+    parser.add_argument('--budget', type=float, help='wall-clock limit in seconds of --search incremental, which then prints the best schedule found')
+    parser.add_argument('--batch', nargs='+', metavar='PATH',
+                        help='solve every .wps file in these directories or globs instead of reading stdin')
+    parser.add_argument('--out-dir', help='directory receiving one .out file per instance and summary.jsonl, for --batch')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='number of instances solved at once, for --batch')
+    parser.add_argument('--timeout', type=float, help='wall-clock limit in seconds for each instance, for --batch')
+    args = parser.parse_args()
+    if args.batch and not args.out_dir:
+        parser.error('--batch needs --out-dir')
+
+    if args.batch:
+        batchSolve(args.batch, args.out_dir, functools.partial(batchInstance, args = args), args.jobs, args.timeout)
+    else:
+        try:
+            instance = readInstance(sys.stdin)
+        except IncorrectFormat as e:
+            sys.exit('Incorrect instance: {}'.format(e))
+        solveProblem(Problem(instance), args)
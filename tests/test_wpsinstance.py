@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from wpsinstance import readInstance, IncorrectFormat
+
+VALID = """2
+3
+1 2
+0 1 2
+1 0 3
+2 3 0
+1 2 3
+2
+2 1 3
+1 2
+"""
+
+
+def test_valid_instance():
+    inst = readInstance(VALID)
+    assert (inst.numRunners, inst.numProds, inst.numOrders) == (2, 3, 2)
+    assert inst.shelvesTimes[1].tolist() == [1, 0, 3]
+    assert [inst.order(o).tolist() for o in range(2)] == [[1, 3], [2]]
+    assert inst.inventory.tolist() == [1, 1, 1]
+
+
+def test_misaligned_shelf_rows():
+    #Same number of values in total, split 2 and 4 between the first two rows
+    text = VALID.replace("0 1 2\n1 0 3\n", "0 1\n2 1 0 3\n")
+    with pytest.raises(IncorrectFormat, match='Line 4: expected 3 values for the times from shelf 1, got 2'):
+        readInstance(text)
+
+
+def test_misaligned_order_lines():
+    text = VALID.replace("2 1 3\n1 2\n", "2 1\n3 1 2\n")
+    with pytest.raises(IncorrectFormat, match='Line 9: order 1 must start with its number of products'):
+        readInstance(text)
+
+
+def test_misaligned_runner_positions():
+    text = VALID.replace("1 2\n0 1 2\n", "1\n2 0 1 2\n")
+    with pytest.raises(IncorrectFormat, match='Line 3: expected 2 values for the initial runner positions, got 1'):
+        readInstance(text)
+
+
+def test_empty_last_order():
+    with pytest.raises(IncorrectFormat, match='Line 10: order 2'):
+        readInstance(VALID[:-len("1 2\n")] + "\n")
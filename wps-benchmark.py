@@ -0,0 +1,271 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import resource
+import platform
+import subprocess
+import importlib.util
+import multiprocessing
+from multiprocessing.connection import wait
+
+root = os.path.dirname(os.path.abspath(__file__))
+engine_sources = {
+    'sat': os.path.join(root, 'Project1', 'src', 'project.py'),
+    'bnb': os.path.join(root, 'Project1', 'src', 'project.py'),
+    'smt': os.path.join(root, 'Project2', 'src', 'project.py'),
+    'smt-incremental': os.path.join(root, 'Project2', 'src', 'project.py'),
+}
+
+
+def load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+generator = load_module('wps_generator', os.path.join(root, 'wps-generator.py'))
+
+
+def peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def bench_sat(project, text, conn, busy_encoding):
+    p = project.Problem(project.readInstance(text))
+    p.busyEncoding = busy_encoding
+
+    start = time.perf_counter()
+    max_time = p.getMaxTimebound()
+    min_time = min(p.getMinTimebound(), max_time)
+    bound_time = time.perf_counter() - start
+
+    # Same encoding as --search incremental, timed separately from the optimization that follows
+    start = time.perf_counter()
+    p.newSolver()
+    p.createVariables(max_time)
+    p.encodeConstraints(max_time)
+    p.encodeHorizon(max_time)
+    conn.send({'bound_time': bound_time, 'encode_time': time.perf_counter() - start,
+               'vars': p.solver.nof_vars(), 'clauses': p.solver.nof_clauses(), 'peak_rss_kb': peak_rss_kb()})
+
+    start = time.perf_counter()
+    timebound, model = project.horizonSearch(min_time, p)
+    conn.send({'solve_time': time.perf_counter() - start, 'status': 'optimal' if model is not None else 'unsat',
+               'makespan': timebound - 1 if model is not None else None, 'peak_rss_kb': peak_rss_kb()})
+
+
+def bench_bnb(project, text, conn):
+    # Nothing is encoded, the whole search is solve time
+    p = project.Problem(project.readInstance(text))
+    conn.send({'bound_time': 0, 'encode_time': 0, 'peak_rss_kb': peak_rss_kb()})
+
+    start = time.perf_counter()
+    schedule = project.branchAndBound(p)
+    conn.send({'solve_time': time.perf_counter() - start, 'status': 'optimal' if schedule is not None else 'unsat',
+               'makespan': schedule[0] if schedule is not None else None, 'peak_rss_kb': peak_rss_kb()})
+
+
+def bench_smt(project, text, conn, incremental, timeout, formulation, theory):
+    deadline = time.perf_counter() + timeout if timeout else None
+    p = project.Problem(project.readInstance(text))
+    p.formulation = formulation
+    p.theory = theory
+
+    start = time.perf_counter()
+    max_time = p.getMaxTimebound()
+    min_time = min(p.getMinTimebound(), max_time - 2)
+    bound_time = time.perf_counter() - start
+
+    # Optimize minimizes T in a single check, the incremental driver asks for earlier and earlier schedules
+    start = time.perf_counter()
+    p.solver = project.z3.SimpleSolver() if incremental else project.z3.Optimize()
+    p.encode(min_time, max_time)
+    if incremental:
+        p.startFromGreedy()
+    else:
+        p.solver.minimize(p.time)
+    conn.send({'bound_time': bound_time, 'encode_time': time.perf_counter() - start,
+               'assertions': len(p.solver.assertions()), 'peak_rss_kb': peak_rss_kb()})
+
+    start = time.perf_counter()
+    if incremental:
+        # Stops a second before the timeout, so the best schedule found so far is still reported
+        budget = max(deadline - time.perf_counter() - 1, 0) if deadline else None
+        model, optimal = project.tighteningSearch(p, budget)
+        status = ('optimal' if model is not None else 'unsat') if optimal else ('feasible' if model is not None else 'unknown')
+    else:
+        result = p.solver.check()
+        model = p.solver.model() if result == project.z3.sat else None
+        status = 'optimal' if model is not None else ('unsat' if result == project.z3.unsat else 'unknown')
+    makespan = p.getSolutionTime(model) if model is not None else None
+    conn.send({'solve_time': time.perf_counter() - start, 'status': status, 'makespan': makespan, 'peak_rss_kb': peak_rss_kb()})
+
+
+def bench_worker(engine, text, conn, busy_encoding, formulation, theory, timeout):
+    # Every run gets a fresh process, so the peak RSS belongs to that run only
+    sys.stdout = open(os.devnull, 'w')
+    project = load_module(f'project_{engine}', engine_sources[engine])
+    if engine == 'sat':
+        bench_sat(project, text, conn, busy_encoding)
+    elif engine == 'bnb':
+        bench_bnb(project, text, conn)
+    else:
+        bench_smt(project, text, conn, engine == 'smt-incremental', timeout, formulation, theory)
+
+
+def proc_peak_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as fp:
+            for line in fp:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def run_case(engine, text, timeout, busy_encoding, formulation, theory):
+    result = {'status': 'error'}
+    recv_end, send_end = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=bench_worker, args=(engine, text, send_end, busy_encoding, formulation, theory, timeout))
+    start = time.perf_counter()
+    process.start()
+    send_end.close()
+
+    try:
+        while True:
+            remaining = timeout - (time.perf_counter() - start) if timeout else None
+            if remaining is not None and remaining <= 0:
+                result['status'] = 'timeout'
+                result['peak_rss_kb'] = max(result.get('peak_rss_kb') or 0, proc_peak_kb(process.pid) or 0)
+                break
+            if not wait([recv_end], remaining):
+                continue
+            try:
+                result.update(recv_end.recv())
+            except EOFError:
+                break
+            if 'solve_time' in result:
+                break
+    finally:
+        if process.is_alive():
+            process.terminate()
+            process.join(1)
+            if process.is_alive():
+                process.kill()
+        process.join()
+        recv_end.close()
+
+    result['wall_time'] = time.perf_counter() - start
+    return result
+
+
+def parse_sizes(spec):
+    return [int(value) for value in spec.split(',') if value]
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def sweep_cases(args):
+    for path in sorted(p for pattern in args.instances for p in glob.glob(pattern)):
+        with open(path) as fp:
+            yield os.path.basename(path), fp.read(), {}
+
+    if args.instances and not args.sweep:
+        return
+
+    for n_runners in parse_sizes(args.runners):
+        for m_products in parse_sizes(args.products):
+            for o_orders in parse_sizes(args.orders):
+                for seed in parse_sizes(args.seeds):
+                    instance = generator.generate(n_runners, m_products, o_orders, args.products_per_order, args.shelves, args.belt, seed)
+                    name = generator.instance_name(n_runners, m_products, o_orders, args.products_per_order, seed)
+                    if args.keep:
+                        os.makedirs(args.keep, exist_ok=True)
+                        with open(os.path.join(args.keep, name), 'w') as fp:
+                            fp.write(instance)
+                    size = {'runners': n_runners, 'products': m_products, 'orders': o_orders, 'seed': seed}
+                    yield name, instance, size
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as fp:
+        baseline = {(r['engine'], r['instance']): r for r in json.load(fp)['results']}
+
+    regressions = 0
+    for r in results:
+        old = baseline.get((r['engine'], r['instance']))
+        if old is None:
+            continue
+        for key in ('encode_time', 'solve_time', 'peak_rss_kb'):
+            if r.get(key) is not None and old.get(key) and r[key] > old[key] * threshold:
+                print(f'REGRESSION {r["engine"]} {r["instance"]} {key}: {old[key]:.6g} -> {r[key]:.6g}', file=sys.stderr)
+                regressions += 1
+        if old.get('status') == 'optimal' and r.get('status') != 'optimal':
+            print(f'REGRESSION {r["engine"]} {r["instance"]} status: {old["status"]} -> {r.get("status")}', file=sys.stderr)
+            regressions += 1
+        elif old.get('makespan') is not None and r.get('makespan') is not None and old['makespan'] != r['makespan']:
+            print(f'MISMATCH {r["engine"]} {r["instance"]} makespan: {old["makespan"]} -> {r["makespan"]}', file=sys.stderr)
+            regressions += 1
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Encode/solve benchmark of the WPS SAT (Project1) and SMT (Project2) engines.')
+    parser.add_argument('instances', nargs='*', help='.wps files or globs to benchmark instead of the generated sweep')
+    parser.add_argument('--sweep', action='store_true', help='run the generated sweep as well as the given instances')
+    parser.add_argument('--engines', default='sat,smt', help='comma separated engines to run (sat, bnb, smt, smt-incremental)')
+    parser.add_argument('-r', '--runners', default='2,3', help='comma separated runner counts of the sweep')
+    parser.add_argument('-p', '--products', default='4,6,8', help='comma separated product counts of the sweep')
+    parser.add_argument('-o', '--orders', default='5,10,20', help='comma separated order counts of the sweep')
+    parser.add_argument('-s', '--seeds', default='0', help='comma separated generator seeds of the sweep')
+    parser.add_argument('-k', '--products-per-order', default='1:3', help='LO:HI distinct products in each generated order')
+    parser.add_argument('--shelves', default='grid:10', help='shelf-time distribution, grid:SIZE or uniform:LO:HI')
+    parser.add_argument('--belt', default='1:10', help='LO:HI conveyor belt time of each generated product')
+    parser.add_argument('--keep', help='save the generated instances to this directory')
+    parser.add_argument('--busy-encoding', choices=['ternary', 'transit'], default='ternary', help='busy-runner encoding of the SAT engine')
+    parser.add_argument('--formulation', choices=['pairwise', 'successor'], default='pairwise', help='formulation of the SMT engines')
+    parser.add_argument('--theory', choices=['int', 'bv'], default='bv', help='theory of the times of the SMT engines')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds allowed for each engine on each instance (0 for no limit)')
+    parser.add_argument('--output', default='benchmark.json', help='JSON file the results are written to')
+    parser.add_argument('--compare', help='previous results file; slower, bigger or worse runs are reported on stderr')
+    parser.add_argument('--threshold', type=float, default=1.5, help='ratio over the previous results counted as a regression')
+
+    args = parser.parse_args()
+    engines = [e for e in args.engines.split(',') if e]
+    for engine in engines:
+        if engine not in engine_sources:
+            parser.error(f'unknown engine {engine!r}')
+
+    results = []
+    for name, text, size in sweep_cases(args):
+        for engine in engines:
+            result = {'engine': engine, 'instance': name, **size}
+            result.update(run_case(engine, text, args.timeout, args.busy_encoding, args.formulation, args.theory))
+            results.append(result)
+            print(f'{engine} {name} {result["status"]} makespan={result.get("makespan")} '
+                  f'encode={result.get("encode_time", 0):.3f}s solve={result.get("solve_time", 0):.3f}s '
+                  f'rss={result.get("peak_rss_kb")}kB', file=sys.stderr)
+
+    report = {
+        'revision': git_revision(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'timeout': args.timeout,
+        'results': results,
+    }
+    with open(args.output, 'w') as fp:
+        json.dump(report, fp, indent=1)
+
+    if args.compare and compare(results, args.compare, args.threshold) > 0:
+        sys.exit(1)
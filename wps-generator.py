@@ -0,0 +1,99 @@
+import random
+import argparse
+import os
+
+
+class IncorrectDistribution(Exception): pass
+
+
+def parse_range(spec, name):
+    try:
+        bounds = list(map(int, spec.split(':')))
+    except ValueError:
+        raise IncorrectDistribution(f'{name} must be LO:HI, got {spec!r}.')
+
+    if len(bounds) == 1:
+        bounds = bounds * 2
+    if len(bounds) != 2 or bounds[0] < 1 or bounds[0] > bounds[1]:
+        raise IncorrectDistribution(f'{name} must be LO:HI with 1 <= LO <= HI, got {spec!r}.')
+    return bounds
+
+
+def shelf_times(m_products, spec, rand):
+    kind, _, params = spec.partition(':')
+
+    if kind == 'grid':
+        # Shelves are placed on a SIZE x SIZE grid and moving takes 1 + the manhattan distance
+        size = int(params or 10)
+        positions = [(rand.randrange(size), rand.randrange(size)) for _ in range(m_products)]
+        return [[1 + abs(a[0] - b[0]) + abs(a[1] - b[1]) for b in positions] for a in positions]
+
+    if kind == 'uniform':
+        lo, hi = parse_range(params, 'uniform shelf times')
+        times = [[1] * m_products for _ in range(m_products)]
+        for i in range(m_products):
+            for j in range(i + 1, m_products):
+                times[i][j] = times[j][i] = rand.randint(lo, hi)
+
+        # The checker requires a strict triangle inequality, so going through another shelf must cost at least one more unit
+        for k in range(m_products):
+            for i in range(m_products):
+                for j in range(m_products):
+                    if i != j and times[i][k] + times[k][j] <= times[i][j]:
+                        times[i][j] = times[i][k] + times[k][j] - 1
+        return times
+
+    raise IncorrectDistribution(f'Unknown shelf-time distribution {spec!r}, expected grid:SIZE or uniform:LO:HI.')
+
+
+def generate(n_runners, m_products, o_orders, products_per_order='1:3', shelves='grid:10', belt='1:10', seed=0):
+    rand = random.Random(seed)
+    order_lo, order_hi = parse_range(products_per_order, 'products per order')
+    belt_lo, belt_hi = parse_range(belt, 'belt times')
+    order_hi = min(order_hi, m_products)
+    order_lo = min(order_lo, order_hi)
+
+    lines = [str(n_runners), str(m_products)]
+    lines.append(' '.join(str(rand.randint(1, m_products)) for _ in range(n_runners)))
+    lines.extend(' '.join(map(str, row)) for row in shelf_times(m_products, shelves, rand))
+    lines.append(' '.join(str(rand.randint(belt_lo, belt_hi)) for _ in range(m_products)))
+    lines.append(str(o_orders))
+    for _ in range(o_orders):
+        prods = sorted(rand.sample(range(1, m_products + 1), rand.randint(order_lo, order_hi)))
+        lines.append(' '.join(map(str, [len(prods)] + prods)))
+
+    return '\n'.join(lines) + '\n'
+
+
+def instance_name(n_runners, m_products, o_orders, products_per_order, seed):
+    return f'g_{n_runners}_{m_products}_{o_orders}_{parse_range(products_per_order, "products per order")[1]}_{seed}.wps'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seeded instance generator for the WPS problem.')
+    parser.add_argument('-r', '--runners', type=int, default=2, help='number of runners')
+    parser.add_argument('-p', '--products', type=int, default=5, help='number of products')
+    parser.add_argument('-o', '--orders', type=int, default=10, help='number of orders')
+    parser.add_argument('-k', '--products-per-order', default='1:3', help='LO:HI distinct products in each order')
+    parser.add_argument('--shelves', default='grid:10', help='shelf-time distribution, grid:SIZE or uniform:LO:HI')
+    parser.add_argument('--belt', default='1:10', help='LO:HI conveyor belt time of each product')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--out-dir', help='write the instance to this directory, named g_R_P_O_K_SEED.wps, instead of stdout')
+
+    args = parser.parse_args()
+    if min(args.runners, args.products, args.orders) < 1:
+        parser.error('runners, products and orders must be positive')
+
+    try:
+        instance = generate(args.runners, args.products, args.orders, args.products_per_order, args.shelves, args.belt, args.seed)
+    except IncorrectDistribution as e:
+        parser.error(str(e))
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+        path = os.path.join(args.out_dir, instance_name(args.runners, args.products, args.orders, args.products_per_order, args.seed))
+        with open(path, 'w') as fp:
+            fp.write(instance)
+        print(path)
+    else:
+        print(instance, end='')
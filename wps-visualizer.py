@@ -129,59 +129,33 @@ def cprint(text, color=None, on_color=None, attrs=None, **kwargs):
 
 
 import argparse
+import bisect
+import json
+import sys
 from typing import IO
 
+from wpsinstance import readInstance, IncorrectFormat
+
 runner_colors = ['red', 'green', 'yellow', 'blue', 'magenta', 'cyan', 'white']
+html_colors = {'red': '#e06c75', 'green': '#98c379', 'yellow': '#e5c07b', 'blue': '#61afef', 'magenta': '#c678dd',
+               'cyan': '#56b6c2', 'white': '#dcdfe4'}
 
 
 def round_up_to_even(f):
     return math.ceil(f / 2.) * 2
 
 
-class IncorrectFormat(Exception): pass
-
-
 class WPS:
 
     def __init__(self, fp: IO):
-        try:
-            self.n_runners = int(fp.readline())
-        except:
-            raise IncorrectFormat('Error while reading number of runners from instance file.')
-
-        try:
-            self.m_products = int(fp.readline())
-        except:
-            raise IncorrectFormat('Error while reading number of products from instance file.')
-
-        try:
-            self.initial_positions = list(map(int, fp.readline().split()))
-        except:
-            raise IncorrectFormat('Error while reading initial runner positions from instance file.')
-
-        try:
-            self.move_times = []
-            for i in range(self.m_products):
-                self.move_times.append(list(map(int, fp.readline().split())))
-        except:
-            raise IncorrectFormat('Error while reading move times between products from instance file.')
-
-        try:
-            self.travel_times = list(map(int, fp.readline().split()))
-        except:
-            raise IncorrectFormat('Error while reading the travel times for each product from instance file.')
-
-        try:
-            self.o_orders = int(fp.readline())
-        except:
-            raise IncorrectFormat('Error while reading number of orders from instance file.')
-
-        try:
-            self.orders = []
-            for i in range(self.o_orders):
-                self.orders.append(list(map(int, fp.readline().split()))[1:])
-        except:
-            raise IncorrectFormat('Error while reading orders from instance file.')
+        instance = readInstance(fp)
+        self.n_runners = instance.numRunners
+        self.m_products = instance.numProds
+        self.initial_positions = instance.initialPos
+        self.move_times = instance.shelvesTimes
+        self.travel_times = instance.beltTimes
+        self.o_orders = instance.numOrders
+        self.orders = [instance.order(o) for o in range(self.o_orders)]
 
         self.product_orders_number = [0] * self.m_products
         self.product_orders_mapping = [[] for i in range(self.m_products)]
@@ -210,67 +184,245 @@ class WPS:
         except:
             raise IncorrectFormat('Error while reading the times at which product was placed in the conveyors from solution file.')
 
-    def print_visualization(self):
+    def max_span(self):
         true_max_span = 0
         for order in self.order_times:
             for product, time in order.items():
                 true_max_span = max(true_max_span, self.travel_times[product - 1] + time)
+        return true_max_span
 
-        if true_max_span != self.max_timespan:
-            print('WARNING: max span is incorrectly calculated...')
-
-        first_column_width = max(map(len, map(lambda x: f'Runner {x + 1}', range(self.n_runners))))
-        first_column_width = max(first_column_width, max(map(len, map(lambda x: f'Product {x + 1}', range(self.m_products)))))
-        first_column_width += 2
-
-        time_cell_width = round_up_to_even(max(2 + len(str(true_max_span + 1)), len(f'p{self.m_products + 1}_{self.o_orders + 1}')))
-        time_cell_spacer = '⎸'.ljust(time_cell_width, ' ')
-
+    def rows(self):
+        # Every row as (name, segments), a segment being (start, end, label, short label, color index). The segments of
+        # a row never overlap and are sorted by start, so they are sorted by end as well
+        rows = []
         for i in range(self.n_runners):
-            print(f'Runner {i + 1}'.ljust(first_column_width, ' '), end='')
-
+            segments = []
             current_pos = self.initial_positions[i]
             current_time = 0
-            for elem, color in zip(self.runner_product[i], itertools.cycle(runner_colors)):
+            for elem, color in zip(self.runner_product[i], itertools.cycle(range(len(runner_colors)))):
                 w = self.move_times[current_pos - 1][elem - 1]
-
-                if len(f'p{current_pos}→p{elem}') + 2 <= time_cell_width * w:
-                    string = f'p{current_pos}→p{elem}'
-                else:
-                    string = f'p{elem}'
-
-                print(colored(string.center(time_cell_width * w), color=color, attrs=['reverse']), end='')
+                segments.append((current_time, current_time + w, f'p{current_pos}→p{elem}', f'p{elem}', color))
                 current_pos = elem
                 current_time += w
+            rows.append((f'Runner {i + 1}', segments))
 
-            print(time_cell_spacer * (true_max_span + 1 - current_time))
-
-        print((' ' * first_column_width) + time_cell_spacer * (true_max_span + 1))
+        self.n_runner_rows = len(rows)
 
+        # The deliveries of a product share as few lanes as possible, each taking the first lane that is free again
         for product_i in range(self.m_products):
-            print(f'Product {product_i + 1}'.ljust(first_column_width, ' '), end='')
-
-            first = True
-
-            if len(self.product_orders_mapping[product_i]) == 0:
-                print(time_cell_spacer * (true_max_span + 1))
-
-            for order_i, color in zip(self.product_orders_mapping[product_i], itertools.cycle(runner_colors)):
-                if not first:
-                    print(' ' * first_column_width, end='')
-                first = False
+            deliveries = []
+            for order_i, color in zip(self.product_orders_mapping[product_i], itertools.cycle(range(len(runner_colors)))):
+                time = self.order_times[order_i][product_i + 1]
+                label = f'p{product_i + 1}_{order_i + 1}'
+                deliveries.append((time, time + self.travel_times[product_i], label, label, color))
+
+            lanes = []
+            for delivery in sorted(deliveries):
+                for lane in lanes:
+                    if lane[-1][1] <= delivery[0]:
+                        lane.append(delivery)
+                        break
+                else:
+                    lanes.append([delivery])
+
+            for lane_i, lane in enumerate(lanes or [[]]):
+                rows.append((f'Product {product_i + 1}' if lane_i == 0 else '', lane))
+        return rows
+
+    def render(self, scale=1, start=0, end=None, columns=None):
+        # The whole frame as one string: every cell covers scale time steps, from start up to end, split in pages of
+        # columns cells
+        true_max_span = self.max_span()
+        end = true_max_span + 1 if end is None else min(end, true_max_span + 1)
+        n_cells = max(0, -(-(end - start) // scale))
+        if n_cells == 0:
+            raise ValueError(f'the schedule ends at {true_max_span}, before the time window starting at {start}')
+        columns = columns or n_cells
 
-                print(time_cell_spacer * self.order_times[order_i][product_i + 1], end='')
-                print(colored(f'p{product_i + 1}_{order_i + 1}'.center(time_cell_width * self.travel_times[product_i]), color=color, attrs=['reverse']), end='')
-                print(time_cell_spacer * (true_max_span + 1 - self.order_times[order_i][product_i + 1] - self.travel_times[product_i]), end='')
+        first_column_width = max(map(len, map(lambda x: f'Runner {x + 1}', range(self.n_runners))))
+        first_column_width = max(first_column_width, max(map(len, map(lambda x: f'Product {x + 1}', range(self.m_products)))))
+        first_column_width += 2
 
-                print()
+        time_cell_width = round_up_to_even(max(2 + len(str(true_max_span + 1)), len(f'p{self.m_products + 1}_{self.o_orders + 1}')))
+        time_cell_spacer = '⎸'.ljust(time_cell_width, ' ')
 
-        print(' ' * first_column_width, end='')
-        for i in range(true_max_span + 1):
-            print(str(i).ljust(time_cell_width, ' '), end='')
+        rows = self.rows()
+        row_ends = [[segment[1] for segment in segments] for name, segments in rows]
 
-        print()
+        out = []
+        if true_max_span != self.max_timespan:
+            out.append('WARNING: max span is incorrectly calculated...\n')
+
+        for page_start in range(0, n_cells, columns):
+            page_cells = min(columns, n_cells - page_start)
+            lo = start + page_start * scale
+            hi = min(end, lo + page_cells * scale)
+            if page_start > 0:
+                out.append('\n')
+
+            for row_i, (name, segments) in enumerate(rows):
+                if row_i == self.n_runner_rows:
+                    out.append(' ' * first_column_width + time_cell_spacer * page_cells + '\n')
+                out.append(name.ljust(first_column_width, ' '))
+
+                filled = 0
+                for t0, t1, label, short, color in segments[bisect.bisect_right(row_ends[row_i], lo):]:
+                    if t0 >= hi:
+                        break
+                    # A segment takes every cell it touches that an earlier segment did not take already
+                    c0 = max((max(t0, lo) - lo) // scale, filled)
+                    c1 = min(max(-(-(min(t1, hi) - lo) // scale), c0 + 1), page_cells)
+                    if c1 <= c0:
+                        continue
+                    width = time_cell_width * (c1 - c0)
+                    if len(label) + 2 <= width or (label == short and len(label) <= width):
+                        text = label
+                    elif len(short) <= width:
+                        text = short
+                    else:
+                        text = ''
+                    out.append(time_cell_spacer * (c0 - filled))
+                    out.append(colored(text.center(width), color=runner_colors[color], attrs=['reverse']))
+                    filled = c1
+                out.append(time_cell_spacer * (page_cells - filled) + '\n')
+
+            out.append(' ' * first_column_width)
+            for c in range(page_cells):
+                out.append(str(lo + c * scale).ljust(time_cell_width, ' '))
+            out.append('\n')
+
+        return ''.join(out)
+
+    def print_visualization(self, scale=1, start=0, end=None, columns=None):
+        sys.stdout.write(self.render(scale, start, end, columns))
+
+    def export_html(self, fp):
+        # Standalone page drawing the schedule as SVG. Only the segments inside the visible time window are in the
+        # document at any time, found by binary search on their ends, so it stays responsive with hundreds of
+        # thousands of picks
+        labels = []
+        label_ids = {}
+        rows = []
+        for name, segments in self.rows():
+            flat = []
+            for t0, t1, label, short, color in segments:
+                if label not in label_ids:
+                    label_ids[label] = len(labels)
+                    labels.append(label)
+                if short not in label_ids:
+                    label_ids[short] = len(labels)
+                    labels.append(short)
+                flat += [t0, t1, label_ids[label], label_ids[short], color]
+            rows.append({'name': name, 'segments': flat})
+
+        data = {'span': self.max_span() + 1, 'runnerRows': self.n_runner_rows, 'rows': rows, 'labels': labels,
+                'colors': [html_colors[color] for color in runner_colors]}
+        fp.write(HTML_TEMPLATE.replace('__DATA__', json.dumps(data, separators=(',', ':'), ensure_ascii=False)))
+
+
+HTML_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>WPS schedule</title>
+<style>
+body { margin: 0; font: 12px monospace; }
+#bar { padding: 4px 8px; border-bottom: 1px solid #ccc; }
+#view { display: flex; }
+#names { flex: none; padding-right: 8px; }
+#scroll { flex: auto; overflow-x: auto; position: relative; }
+#names div, #svg { line-height: 20px; }
+text { pointer-events: none; }
+</style>
+</head>
+<body>
+<div id="bar">
+<button id="out">&minus;</button> <button id="in">+</button>
+<span id="zoom"></span> &mdash; ctrl+wheel zooms, hover a segment for its times
+</div>
+<div id="view"><div id="names"></div><div id="scroll"><div id="width"></div><svg id="svg" style="position:absolute;top:0"></svg></div></div>
+<script>
+const data = __DATA__;
+const ROW = 20, SEP = 10, AXIS = 20;
+const NS = 'http://www.w3.org/2000/svg';
+const scroll = document.getElementById('scroll'), svg = document.getElementById('svg');
+const names = document.getElementById('names');
+let px = Math.max(2, Math.min(40, 1600 / data.span));
+
+const tops = [];
+let y = 0;
+data.rows.forEach((row, i) => {
+  if (i === data.runnerRows) y += SEP;
+  tops.push(y);
+  const div = document.createElement('div');
+  div.textContent = row.name || '\\u00a0';
+  div.style.cssText = 'position:absolute;top:' + y + 'px';
+  names.appendChild(div);
+  y += ROW;
+});
+const height = y + AXIS;
+names.style.cssText = 'position:relative;width:' + (Math.max(...data.rows.map(r => r.name.length)) + 2) + 'ch;height:' + height + 'px';
+scroll.style.height = (height + 20) + 'px';
+
+function firstEnding(segments, t) {
+  // Index of the first segment ending after t; segments are flat groups of 5 sorted by end
+  let lo = 0, hi = segments.length / 5;
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1;
+    if (segments[mid * 5 + 1] <= t) lo = mid + 1; else hi = mid;
+  }
+  return lo;
+}
+
+function draw() {
+  const left = scroll.scrollLeft, width = scroll.clientWidth;
+  const lo = Math.floor(left / px), hi = Math.ceil((left + width) / px);
+  svg.setAttribute('width', width);
+  svg.setAttribute('height', height);
+  svg.style.left = left + 'px';
+  const parts = [];
+  data.rows.forEach((row, i) => {
+    const s = row.segments;
+    for (let k = firstEnding(s, lo) * 5; k < s.length && s[k] < hi; k += 5) {
+      const x = s[k] * px - left, w = (s[k + 1] - s[k]) * px;
+      const label = data.labels[s[k + 2]], short = data.labels[s[k + 3]];
+      parts.push('<rect x="' + x + '" y="' + (tops[i] + 1) + '" width="' + Math.max(w - 1, 1) + '" height="' + (ROW - 2) +
+                 '" fill="' + data.colors[s[k + 4]] + '"><title>' + label + ' [' + s[k] + ', ' + s[k + 1] + ')</title></rect>');
+      const text = (label.length + 1) * 7 <= w ? label : (short.length + 1) * 7 <= w ? short : '';
+      if (text) parts.push('<text x="' + (x + w / 2) + '" y="' + (tops[i] + 14) + '" text-anchor="middle">' + text + '</text>');
+    }
+  });
+  const step = Math.max(1, Math.pow(10, Math.ceil(Math.log10(60 / px))));
+  for (let t = Math.floor(lo / step) * step; t <= hi; t += step) {
+    parts.push('<line x1="' + (t * px - left) + '" x2="' + (t * px - left) + '" y1="0" y2="' + (height - AXIS) + '" stroke="#ddd"/>');
+    parts.push('<text x="' + (t * px - left + 2) + '" y="' + (height - 6) + '">' + t + '</text>');
+  }
+  svg.innerHTML = parts.join('');
+}
+
+function zoom(factor, anchor) {
+  const t = (scroll.scrollLeft + anchor) / px;
+  px = Math.max(1e-3, Math.min(200, px * factor));
+  document.getElementById('width').style.cssText = 'width:' + (data.span * px) + 'px;height:1px';
+  document.getElementById('zoom').textContent = px >= 1 ? px.toFixed(1) + ' px per step' : (1 / px).toFixed(1) + ' steps per px';
+  scroll.scrollLeft = t * px - anchor;
+  draw();
+}
+
+scroll.addEventListener('scroll', () => requestAnimationFrame(draw));
+window.addEventListener('resize', draw);
+scroll.addEventListener('wheel', e => {
+  if (!e.ctrlKey) return;
+  e.preventDefault();
+  zoom(e.deltaY < 0 ? 1.25 : 0.8, e.clientX - scroll.getBoundingClientRect().left);
+}, {passive: false});
+document.getElementById('in').onclick = () => zoom(2, scroll.clientWidth / 2);
+document.getElementById('out').onclick = () => zoom(0.5, scroll.clientWidth / 2);
+zoom(1, 0);
+</script>
+</body>
+</html>
+'''
 
 
 if __name__ == '__main__':
@@ -278,8 +430,17 @@ if __name__ == '__main__':
 
     parser.add_argument('INSTANCE', help='instance file')
     parser.add_argument('SOLUTION', help='solution file containing the scheduling')
+    parser.add_argument('--scale', type=int, default=1, help='time steps covered by each cell')
+    parser.add_argument('--start', type=int, default=0, help='first time step shown')
+    parser.add_argument('--end', type=int, help='time step after the last one shown (default: the whole schedule)')
+    parser.add_argument('--columns', type=int, help='cells per page, the window is printed as consecutive pages')
+    parser.add_argument('--html', metavar='FILE', help='write a standalone HTML/SVG page of the schedule instead of printing it')
 
     args = parser.parse_args()
+    if args.scale < 1 or (args.columns is not None and args.columns < 1):
+        parser.error('--scale and --columns must be positive')
+    if args.start < 0 or (args.end is not None and args.end <= args.start):
+        parser.error('--start must not be negative and --end must be after --start')
 
     with open(args.INSTANCE) as f:
         wps = WPS(f)
@@ -287,4 +448,11 @@ if __name__ == '__main__':
     with open(args.SOLUTION) as f:
         wps.read_solution(f)
 
-    wps.print_visualization()
+    if args.html:
+        with open(args.html, 'w') as f:
+            wps.export_html(f)
+    else:
+        try:
+            wps.print_visualization(args.scale, args.start, args.end, args.columns)
+        except ValueError as e:
+            sys.exit(f'Nothing to draw: {e}.')
@@ -0,0 +1,102 @@
+import os
+import sys
+import glob
+import json
+import time
+import signal
+import resource
+import multiprocessing
+from multiprocessing.connection import wait
+
+
+def batchWorker(solve, path, outPath, conn):
+    #Runs in its own process: solves one instance with solve(path), which prints the schedule and returns its
+    #(status, makespan), writing the schedule to outPath
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    start = time.time()
+    with open(outPath, 'w') as out:
+        sys.stdout = out
+        status, makespan = solve(path)
+        sys.stdout = sys.__stdout__
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    conn.send((status, makespan, time.time() - start, peak))
+
+def peakMemory(pid):
+    #Peak resident memory in KB of a running process, read from /proc
+    try:
+        with open('/proc/{}/status'.format(pid)) as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def batchSolve(paths, outDir, solve, jobs = 1, timeout = None):
+    #Solves every .wps file in the directories or globs of paths in worker processes, largest first, and writes one
+    #.out file per instance and a JSON lines summary to outDir. solve must be picklable, e.g. a module level function or
+    #a functools.partial of one
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += glob.glob(os.path.join(path, '*.wps'))
+        else:
+            files += glob.glob(path)
+    files = sorted(set(files), key = lambda f: (-os.path.getsize(f), f))
+
+    os.makedirs(outDir, exist_ok = True)
+    pending = list(files)
+    running = dict()
+
+    with open(os.path.join(outDir, 'summary.jsonl'), 'w') as summary:
+        def record(path, status, makespan, seconds, peak):
+            entry = {'instance': os.path.basename(path), 'status': status, 'makespan': makespan,
+                     'time': round(seconds, 3), 'peak_rss_kb': peak}
+            summary.write(json.dumps(entry) + "\n")
+            summary.flush()
+            print("{instance} {status} {makespan} {time}s".format(**entry), file=sys.stderr)
+
+        try:
+            while len(pending) > 0 or len(running) > 0:
+                while len(pending) > 0 and len(running) < max(jobs, 1):
+                    path = pending.pop(0)
+                    outPath = os.path.join(outDir, os.path.splitext(os.path.basename(path))[0] + '.out')
+                    conn, childConn = multiprocessing.Pipe()
+                    proc = multiprocessing.Process(target = batchWorker, args = (solve, path, outPath, childConn))
+                    proc.start()
+                    running[conn] = (path, outPath, proc, time.time())
+
+                wakeup = None
+                if timeout is not None:
+                    wakeup = max(0, min([start + timeout for (path, outPath, proc, start) in running.values()]) - time.time())
+
+                for conn in wait(list(running), timeout = wakeup):
+                    path, outPath, proc, start = running.pop(conn)
+                    try:
+                        status, makespan, seconds, peak = conn.recv()
+                    except EOFError:
+                        status, makespan, seconds, peak = 'ERROR', None, time.time() - start, None
+                    proc.join()
+                    conn.close()
+                    record(path, status, makespan, seconds, peak)
+
+                if timeout is not None:
+                    for conn in list(running):
+                        path, outPath, proc, start = running[conn]
+                        if time.time() - start >= timeout:
+                            peak = peakMemory(proc.pid)
+                            proc.terminate()
+                            proc.join(1)
+                            if proc.is_alive():
+                                proc.kill()
+                                proc.join()
+                            conn.close()
+                            del running[conn]
+                            #The schedule of a run that was cut short is incomplete at best
+                            if os.path.exists(outPath):
+                                os.remove(outPath)
+                            record(path, 'TIMEOUT', None, timeout, peak)
+        finally:
+            for path, outPath, proc, start in running.values():
+                proc.terminate()
+                proc.join()
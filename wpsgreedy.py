@@ -0,0 +1,147 @@
+import math
+import random
+
+
+class ListScheduler:
+    #Greedy list scheduler shared by the engines, mixed into their Problem classes. It only needs the instance
+    #attributes every Problem has (runners, products, orders, shelvesTimes, productInventory, numRunners, numProds) and
+    #greedyRestarts. The next pick of a runner is usually the first product of its shelf's row of the pick table, and
+    #is only looked for again when it was taken by another runner, so a schedule costs about O(picks * runners)
+
+    def pickTable(self, remaining):
+        #pickTable(remaining)[i] - (product, time from shelf i+1 to it, its belt time) of every product with units
+        #remaining, the ones that arrive first from shelf i+1 first
+        return [sorted([(j.id, row[j.id-1], j.beltTime) for j in self.products if remaining[j.id] > 0],
+                       key = lambda o: (o[1] + o[2], o[1], o[0])) for row in self.shelvesTimes]
+
+    def nextPick(self, table, pos, cur, usedArrivals, blocked, rand = None):
+        #Earliest arriving pick a runner at shelf pos at time cur can make next (or a random one), as (arrival, pick
+        #time, product), blocked holding the (time, shelf) the runner left before, as it can not pick a product at the
+        #exact time it would reach it directly from one of them
+        shelvesTimes = self.shelvesTimes
+        if rand is not None:
+            options = [(cur + t + b, cur + t, j) for (j, t, b) in table[pos-1]
+                       if (cur + t + b) not in usedArrivals and all([c + shelvesTimes[q-1][j-1] != cur + t for (c, q) in blocked])]
+            if len(options) == 0:
+                return None
+            #Drawn in product order, so each seed keeps drawing the same schedule whatever the order of the table
+            options.sort(key = lambda o: o[2])
+            return rand.choice(options)
+
+        #The rows are sorted by arrival, so the first pick left is the earliest one
+        for (j, t, b) in table[pos-1]:
+            if (cur + t + b) not in usedArrivals:
+                k = cur + t
+                for (c, q) in blocked:
+                    if c + shelvesTimes[q-1][j-1] == k:
+                        break
+                else:
+                    return (k + b, k, j)
+        return None
+
+    def listSchedule(self, rule, seed = 0):
+        #earliest - always make the pick that arrives first to the packaging area
+        #balanced - always move the runner that has been busy for the shortest time
+        #random - move a random runner, used to restart when the other rules get stuck
+        rand = random.Random(seed) if rule == 'random' else None
+        remaining = dict(self.productInventory)
+        left = sum(remaining.values())
+        if left < self.numRunners:
+            #Every runner must carry at least one product
+            return None
+
+        table = self.pickTable(remaining)
+        maxTravel = max([max(row) for row in self.shelvesTimes])
+        pos = dict()
+        cur = dict()
+        runnerProds = dict()
+        blocked = dict()
+        for r in self.runners:
+            pos[r.id] = r.initialPos
+            cur[r.id] = 0
+            runnerProds[r.id] = []
+            blocked[r.id] = []
+        usedArrivals = set()
+        numIdle = self.numRunners
+
+        best = dict()
+        for r in self.runners:
+            best[r.id] = self.nextPick(table, pos[r.id], cur[r.id], usedArrivals, blocked[r.id], rand)
+
+        while left > 0:
+            #1 - Runners that can not move anymore limit how long the others can stay active
+            stuck = [cur[r] for r in best if best[r] is None]
+            limit = 2*min(stuck) if len(stuck) > 0 else None
+            if numIdle >= left:
+                #The remaining products are needed by the runners that did not carry anything yet
+                candidates = [r for r in runnerProds if len(runnerProds[r]) == 0 and best[r] is not None]
+            else:
+                candidates = [r for r in best if best[r] is not None and (limit is None or best[r][1] <= limit)]
+            if len(candidates) == 0:
+                return None
+
+            if rule == 'balanced':
+                r = min([(cur[i], best[i], i) for i in candidates])[2]
+            elif rule == 'random':
+                r = rand.choice(candidates)
+            else:
+                r = min([(best[i], i) for i in candidates])[1]
+            a, k, j = best[r]
+
+            #A runner can not reach a later product at the exact time it would take to go there directly from an earlier one
+            #(the shelves left more than maxTravel before the pick time can not block any later pick)
+            blocked[r].append((cur[r], pos[r]))
+            while blocked[r][0][0] + maxTravel < k:
+                blocked[r].pop(0)
+
+            if len(runnerProds[r]) == 0:
+                numIdle -= 1
+            runnerProds[r].append((j, k))
+            pos[r] = j
+            cur[r] = k
+            remaining[j] -= 1
+            left -= 1
+            usedArrivals.add(a)
+            if remaining[j] == 0:
+                table = self.pickTable(remaining)
+
+            for r1 in best:
+                if r1 == r or (best[r1] is not None and (best[r1][0] == a or remaining[best[r1][2]] == 0)):
+                    best[r1] = self.nextPick(table, pos[r1], cur[r1], usedArrivals, blocked[r1], rand)
+
+        #1 - A runner cannot spend less than 50% of the max timespan amongst other runners
+        if min(cur.values()) < math.ceil(max(cur.values())/2):
+            return None
+        return self.completeSchedule(runnerProds)
+
+    def completeSchedule(self, runnerProds):
+        #(makespan, runner picks, order pick times) of the picks of every runner, the earliest picks of a product going to the first orders
+        picks = dict()
+        for j in self.products:
+            picks[j.id] = []
+        for r in runnerProds:
+            for (j, k) in runnerProds[r]:
+                picks[j].append(k)
+        for j in picks:
+            picks[j].sort(reverse = True)
+
+        orders = dict()
+        for o in self.orders:
+            orders[o.id] = dict()
+            for j in o.prods:
+                orders[o.id][j] = picks[j].pop()
+
+        makespan = max([k + self.products[j-1].beltTime for r in runnerProds for (j, k) in runnerProds[r]])
+        return makespan, runnerProds, orders
+
+    def greedySchedule(self):
+        #Feasible schedule built without any solver, as (makespan, runner picks, order pick times), or None
+        for rule in ['earliest', 'balanced']:
+            schedule = self.listSchedule(rule)
+            if schedule is not None:
+                return schedule
+        for seed in range(self.greedyRestarts):
+            schedule = self.listSchedule('random', seed)
+            if schedule is not None:
+                return schedule
+        return None
@@ -0,0 +1,197 @@
+import hashlib
+import itertools
+import collections
+from array import array
+
+
+class IncorrectFormat(Exception): pass
+
+
+class Product:
+    __slots__ = ['id', 'beltTime']
+
+    def __init__(self, id, beltTime):
+        self.id = id
+        self.beltTime = beltTime
+
+class Order:
+    __slots__ = ['id', 'numProds', 'prods']
+
+    def __init__(self, id, numProds, prods):
+        self.id = id
+        self.numProds = numProds
+        self.prods = prods
+
+class Runner:
+    __slots__ = ['id', 'initialPos']
+
+    def __init__(self, id, initialPos):
+        self.id = id
+        self.initialPos = initialPos
+
+
+class Instance:
+    #A parsed .wps instance. Every table is a flat int32 array: the shelf times matrix row by row (shelvesTimes gives
+    #its rows as memoryviews, so shelvesTimes[i][j] reads like the old list of lists), the belt times, and the products
+    #of all orders one after the other, with orderStart[o] the position of order o (orderStart[numOrders] is the end)
+    __slots__ = ['numRunners', 'numProds', 'numOrders', 'initialPos', 'shelfTimes', 'shelvesTimes', 'beltTimes',
+                 'orderStart', 'orderProds', 'inventory', 'digest']
+
+    def order(self, o):
+        #Products of the (0-based) order o
+        return memoryview(self.orderProds)[self.orderStart[o]:self.orderStart[o+1]]
+
+    def runners(self):
+        return [Runner(i+1, self.initialPos[i]) for i in range(self.numRunners)]
+
+    def products(self):
+        return [Product(i+1, self.beltTimes[i]) for i in range(self.numProds)]
+
+    def orders(self):
+        view, start = memoryview(self.orderProds), self.orderStart
+        return [Order(o+1, start[o+1] - start[o], view[start[o]:start[o+1]]) for o in range(self.numOrders)]
+
+
+def parseTokens(tokens, counts):
+    #Parses the whole instance as one stream of integers, which is much faster than going line by line, with counts[i]
+    #the number of values on line i. Returns None when anything does not add up, including the number of values on any
+    #line, so parseLines can point out what is wrong
+    if len(counts) < 5 or counts[0] != 1 or counts[1] != 1:
+        return None
+    inst = Instance()
+    inst.numRunners, inst.numProds = tokens[0], tokens[1]
+    if inst.numRunners < 1 or inst.numProds < 1 or len(counts) < inst.numProds + 5:
+        return None
+    #Values expected on each line up to the number of orders
+    widths = [1, 1, inst.numRunners] + [inst.numProds]*(inst.numProds + 1) + [1]
+    if counts[:len(widths)].tolist() != widths:
+        return None
+    pos = 2
+    inst.initialPos = tokens[pos:pos+inst.numRunners]
+    pos += inst.numRunners
+    inst.shelfTimes = tokens[pos:pos+inst.numProds*inst.numProds]
+    pos += inst.numProds*inst.numProds
+    inst.beltTimes = tokens[pos:pos+inst.numProds]
+    pos += inst.numProds
+    inst.numOrders = tokens[pos]
+    pos += 1
+    if inst.numOrders < 0 or len(counts) != len(widths) + inst.numOrders:
+        return None
+    if min(inst.initialPos) < 1 or max(inst.initialPos) > inst.numProds or min(inst.shelfTimes) < 0 or min(inst.beltTimes) < 0:
+        return None
+
+    inst.orderStart = array('q', [0])
+    inst.orderProds = array('i')
+    orderCounts = counts[len(widths):]
+    for o in range(inst.numOrders):
+        n = orderCounts[o] - 1
+        if n < 0 or tokens[pos] != n:
+            return None
+        inst.orderProds.extend(tokens[pos+1:pos+1+n])
+        inst.orderStart.append(len(inst.orderProds))
+        pos += n + 1
+    if inst.orderProds and (min(inst.orderProds) < 1 or max(inst.orderProds) > inst.numProds):
+        return None
+
+    inst.inventory = array('i', bytes(4*inst.numProds))
+    for j, count in collections.Counter(inst.orderProds).items():
+        inst.inventory[j-1] = count
+    return inst
+
+
+def parseLines(lines):
+    #Line by line parse, checking every dimension and product id and naming the line of the first error
+    pos = 0
+
+    def nextLine(what):
+        nonlocal pos
+        if pos >= len(lines):
+            raise IncorrectFormat('Unexpected end of instance while reading {}.'.format(what))
+        try:
+            values = array('i', map(int, lines[pos].split()))
+        except (ValueError, OverflowError):
+            raise IncorrectFormat('Line {}: expected integers while reading {}, got "{}".'.format(pos+1, what, lines[pos].strip()))
+        pos += 1
+        return values
+
+    def expect(values, count, what):
+        if len(values) != count:
+            raise IncorrectFormat('Line {}: expected {} values for {}, got {}.'.format(pos, count, what, len(values)))
+
+    def expectProducts(values, numProds, what):
+        for j in values:
+            if j < 1 or j > numProds:
+                raise IncorrectFormat('Line {}: product {} in {} is not between 1 and {}.'.format(pos, j, what, numProds))
+
+    def expectCount(values, what, minimum):
+        expect(values, 1, what)
+        if values[0] < minimum:
+            raise IncorrectFormat('Line {}: the {} must be at least {}, got {}.'.format(pos, what, minimum, values[0]))
+        return values[0]
+
+    inst = Instance()
+    inst.numRunners = expectCount(nextLine('the number of runners'), 'number of runners', 1)
+    inst.numProds = expectCount(nextLine('the number of products'), 'number of products', 1)
+
+    inst.initialPos = nextLine('the initial runner positions')
+    expect(inst.initialPos, inst.numRunners, 'the initial runner positions')
+    expectProducts(inst.initialPos, inst.numProds, 'the initial runner positions')
+
+    inst.shelfTimes = array('i')
+    for i in range(inst.numProds):
+        row = nextLine('the times between product shelves')
+        expect(row, inst.numProds, 'the times from shelf {}'.format(i+1))
+        if min(row) < 0:
+            raise IncorrectFormat('Line {}: negative time from shelf {}.'.format(pos, i+1))
+        inst.shelfTimes.extend(row)
+    inst.beltTimes = nextLine('the conveyor belt times')
+    expect(inst.beltTimes, inst.numProds, 'the conveyor belt times')
+    if min(inst.beltTimes) < 0:
+        raise IncorrectFormat('Line {}: negative conveyor belt time.'.format(pos))
+
+    inst.numOrders = expectCount(nextLine('the number of orders'), 'number of orders', 0)
+    inst.orderStart = array('q', [0])
+    inst.orderProds = array('i')
+    inst.inventory = array('i', bytes(4*inst.numProds))
+    for o in range(inst.numOrders):
+        order = nextLine('order {}'.format(o+1))
+        if len(order) == 0 or order[0] != len(order) - 1:
+            raise IncorrectFormat('Line {}: order {} must start with its number of products, followed by them.'.format(pos, o+1))
+        prods = order[1:]
+        expectProducts(prods, inst.numProds, 'order {}'.format(o+1))
+        inst.orderProds.extend(prods)
+        inst.orderStart.append(len(inst.orderProds))
+        for j in prods:
+            inst.inventory[j-1] += 1
+
+    for i in range(pos, len(lines)):
+        if lines[i].strip():
+            raise IncorrectFormat('Line {}: unexpected content after the last order.'.format(i+1))
+
+    return inst
+
+
+def readInstance(fp):
+    #Parses a .wps stream (or string), checking every dimension and product id
+    text = fp if isinstance(fp, str) else fp.read()
+    lines = text.splitlines()
+    numLines = len(lines)
+    while numLines > 0 and not lines[numLines-1].strip():
+        numLines -= 1
+    #Converting a few hundred lines at a time keeps the temporary lists small, and fromlist is the fast path of array
+    tokens = array('i')
+    counts = array('i')
+    try:
+        for i in range(0, numLines, 512):
+            split = [line.split() for line in lines[i:i+512]]
+            counts.fromlist(list(map(len, split)))
+            tokens.fromlist(list(map(int, itertools.chain.from_iterable(split))))
+        inst = parseTokens(tokens, counts)
+    except (ValueError, OverflowError):
+        inst = None
+    if inst is None:
+        inst = parseLines(lines)
+    view = memoryview(inst.shelfTimes)
+    inst.shelvesTimes = [view[i*inst.numProds:(i+1)*inst.numProds] for i in range(inst.numProds)]
+    inst.digest = hashlib.sha256(text.encode()).hexdigest()
+    return inst